@@ -0,0 +1,198 @@
+"""
+Benchmark the peak memory of converting a large synthetic export against the budget.
+
+Streams an export ZIP of --points GPX track points (one route per workout, random-walk
+tracks recorded once a second) to disk, runs healthkit_converter.py on it in a
+subprocess with --memory-limit and --workers, and samples the proportional set size
+(PSS) of the converter and its GPX worker processes. PSS splits pages shared after fork
+between the processes, so the sum is the memory the conversion actually holds. The
+peak of the sum is reported against the budget; the export is kept for reruns.
+
+    python benchmarks/bench_convert_memory.py --points 100000000 --memory-limit 2GB \\
+        --workers 2 --dir /tmp/bench-convert
+
+Linux only: the sampler reads /proc.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "example_package"))
+
+from healthkit_converter import parse_size  # noqa: E402
+
+
+def write_export(zip_path: Path, n_points: int, points_per_workout: int) -> int:
+    """Stream a synthetic export to ``zip_path``, returning the number of workouts."""
+    n_workouts = max(1, n_points // points_per_workout)
+    rng = np.random.default_rng(0)
+    # Time of day of each point, 1 s apart from 08:00
+    seconds = 8 * 3600 + np.arange(points_per_workout)
+    times = [f"T{s // 3600 % 24:02d}:{s // 60 % 60:02d}:{s % 60:02d}Z" for s in seconds]
+    tmp_path = zip_path.with_suffix(".tmp")
+    with zipfile.ZipFile(
+        tmp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1
+    ) as zf:
+        xml = ['<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_AU">\n']
+        for i in range(n_workouts):
+            start = datetime(2000, 1, 1, 8) + timedelta(days=i)
+            end = start + timedelta(seconds=points_per_workout)
+            day = f"{start:%Y-%m-%d}"
+            route = f"/workout-routes/route_{day}_08.00.gpx"
+            xml.append(
+                '<Workout workoutActivityType="HKWorkoutActivityTypeWalking" '
+                f'duration="{points_per_workout / 60:.1f}" durationUnit="min" '
+                f'sourceName="Apple Watch" startDate="{start:%Y-%m-%d %H:%M:%S} +0000" '
+                f'endDate="{end:%Y-%m-%d %H:%M:%S} +0000">\n'
+                '<WorkoutRoute sourceName="Apple Watch">'
+                f'<FileReference path="{route}"/></WorkoutRoute>\n</Workout>\n'
+            )
+            steps = rng.normal(0, 2e-5, (points_per_workout, 3)).cumsum(axis=0)
+            latitude = -33.8 + steps[:, 0]
+            longitude = 151.0 + steps[:, 1]
+            altitude = 100 + 1e3 * steps[:, 2]
+            with zf.open(f"apple_health_export{route}", "w", force_zip64=True) as fp:
+                fp.write(
+                    b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                    b'<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+                    b"<trk><trkseg>"
+                )
+                fp.write(
+                    "".join(
+                        f'<trkpt lon="{lon:.6f}" lat="{lat:.6f}"><ele>{ele:.1f}</ele>'
+                        f"<time>{day}{t}</time></trkpt>"
+                        for lon, lat, ele, t in zip(
+                            longitude.tolist(),
+                            latitude.tolist(),
+                            altitude.tolist(),
+                            times,
+                        )
+                    ).encode()
+                )
+                fp.write(b"</trkseg></trk></gpx>")
+        xml.append("</HealthData>\n")
+        zf.writestr("apple_health_export/export.xml", "".join(xml))
+    os.replace(tmp_path, zip_path)
+    return n_workouts
+
+
+def descendants(pid: int) -> list:
+    """``pid`` and every process below it."""
+    children = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            # The command name in field 2 is parenthesised and may contain spaces
+            ppid = int((entry / "stat").read_text().rpartition(")")[2].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry.name))
+    tree, stack = [], [pid]
+    while stack:
+        tree.append(stack.pop())
+        stack.extend(children.get(tree[-1], []))
+    return tree
+
+
+def pss_bytes(pid: int) -> int:
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    except OSError:  # The process has exited
+        pass
+    return 0
+
+
+def run_converter(args, zip_path: Path, db_path: Path, log_path: Path) -> dict:
+    """Run the converter, sampling the PSS of its process tree until it exits."""
+    for path in db_path.parent.glob(db_path.name + "*"):
+        path.unlink()
+    command = [
+        sys.executable,
+        str(ROOT / "src" / "example_package" / "healthkit_converter.py"),
+        "--zip",
+        str(zip_path),
+        "--duckdb",
+        str(db_path),
+        "--memory-limit",
+        args.memory_limit,
+        "--workers",
+        str(args.workers),
+        "--temp-dir",
+        str(args.dir / "spill"),
+        "--force",
+    ]
+    if args.threads:
+        command += ["--threads", str(args.threads)]
+    peak = {"total": 0, "converter": 0, "workers": 0}
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(args.interval):
+                tree = descendants(process.pid)
+                sizes = [pss_bytes(pid) for pid in tree]
+                peak["total"] = max(peak["total"], sum(sizes))
+                peak["converter"] = max(peak["converter"], sizes[0])
+                peak["workers"] = max(peak["workers"], sum(sizes[1:]))
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        returncode = process.wait()
+        done.set()
+        sampler.join()
+    return {**peak, "seconds": time.perf_counter() - start, "returncode": returncode}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=100_000_000)
+    parser.add_argument("--points-per-workout", type=int, default=10_000)
+    parser.add_argument("--memory-limit", default="2GB")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds")
+    parser.add_argument("--dir", type=Path, default=Path("/tmp/bench-convert"))
+    args = parser.parse_args()
+
+    args.dir.mkdir(parents=True, exist_ok=True)
+    zip_path = args.dir / f"export_{args.points}_{args.points_per_workout}.zip"
+    if not zip_path.exists():
+        start = time.perf_counter()
+        n_workouts = write_export(zip_path, args.points, args.points_per_workout)
+        print(
+            f"Wrote {args.points:,} points in {n_workouts:,} workouts to {zip_path} "
+            f"({zip_path.stat().st_size / 2**30:.1f} GiB) "
+            f"in {time.perf_counter() - start:.0f} s"
+        )
+
+    log_path = args.dir / "convert.log"
+    result = run_converter(args, zip_path, args.dir / "healthkit.duckdb", log_path)
+    budget = parse_size(args.memory_limit)
+    print(
+        f"Converted in {result['seconds']:.0f} s (exit code {result['returncode']}); "
+        f"log in {log_path}"
+    )
+    for label in ("total", "converter", "workers"):
+        print(f"{label:>10}: peak PSS {result[label] / 2**20:8,.0f} MiB")
+    verdict = "within" if result["total"] <= budget else "OVER"
+    print(f"{verdict} the {args.memory_limit} budget ({budget / 2**20:,.0f} MiB)")
+    sys.exit(result["returncode"] or result["total"] > budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark per-workout point lookups before and after clustering workout_points.
+
+Builds a synthetic DuckDB database whose points are stored in random order, times
+HealthKitAnalyser.get_workout_points for a sample of workouts and a single
+HealthKitAnalyser.get_workout_points_many call for all of them, clusters the table with
+HealthKitConverter.cluster_workout_points and times both again. Clustering also writes
+workout_point_ranges, which the batched call then joins on by rowid range.
+
+    python benchmarks/bench_workout_points.py --points 50000000 --db /tmp/bench.duckdb
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import duckdb
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src" / "example_package"))
+
+from healthkit_analyser import HealthKitAnalyser, HealthKitConfig  # noqa: E402
+from healthkit_converter import HealthKitConverter  # noqa: E402
+
+
+def build_database(db_path: Path, n_points: int, points_per_workout: int):
+    db_path.unlink(missing_ok=True)
+    n_workouts = max(1, n_points // points_per_workout)
+    with duckdb.connect(str(db_path)) as con:
+        con.execute(f"""
+            CREATE TABLE workouts AS
+            SELECT
+                sha1(CAST(i AS VARCHAR)) AS id,
+                TIMESTAMPTZ '2020-01-01 00:00:00+00' + INTERVAL (i) DAY AS startDate,
+                90.0 AS duration
+            FROM range({n_workouts}) t(i)
+        """)
+        con.execute(f"""
+            CREATE TABLE workout_points AS
+            SELECT
+                TIMESTAMPTZ '2020-01-01 00:00:00+00' + to_seconds(i % {points_per_workout}) AS date,
+                -33.8 + random() / 100 AS latitude,
+                151.0 + random() / 100 AS longitude,
+                100 * random() AS altitude,
+                sha1(CAST(i // {points_per_workout} AS VARCHAR)) AS workout_id
+            FROM range({n_points}) t(i)
+            ORDER BY random()
+        """)
+    return n_workouts
+
+
+def time_lookups(db_path: Path, workout_ids: list) -> list:
+    analyser = HealthKitAnalyser(
+        HealthKitConfig(db_path=db_path, sql_dir=ROOT / "sql", map_defaults={})
+    )
+    timings = []
+    for workout_id in workout_ids:
+        start = time.perf_counter()
+        analyser.get_workout_points(workout_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def time_batched(db_path: Path, workout_ids: list) -> float:
+    analyser = HealthKitAnalyser(
+        HealthKitConfig(db_path=db_path, sql_dir=ROOT / "sql", map_defaults={})
+    )
+    start = time.perf_counter()
+    analyser.get_workout_points_many(workout_ids)
+    return (time.perf_counter() - start) * 1000
+
+
+def report(label: str, timings: list):
+    print(
+        f"{label:>10}: median {statistics.median(timings):8.2f} ms, "
+        f"p95 {sorted(timings)[int(0.95 * (len(timings) - 1))]:8.2f} ms"
+    )
+
+
+def report_batched(batched: float, one_by_one: list):
+    print(
+        f"{'batched':>10}: {batched:8.2f} ms for {len(one_by_one)} workouts "
+        f"(vs {sum(one_by_one):.2f} ms one by one)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", type=Path, default=Path("bench-workout-points.duckdb"))
+    parser.add_argument("--points", type=int, default=50_000_000)
+    parser.add_argument("--points-per-workout", type=int, default=5_000)
+    parser.add_argument("--lookups", type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    n_workouts = build_database(args.db, args.points, args.points_per_workout)
+    print(
+        f"Built {args.points:,} points / {n_workouts:,} workouts in {time.perf_counter() - start:.1f} s"
+    )
+
+    with duckdb.connect(str(args.db), read_only=True) as con:
+        workout_ids = [
+            row[0]
+            for row in con.execute(
+                f"SELECT id FROM workouts USING SAMPLE {min(args.lookups, n_workouts)} ROWS"
+            ).fetchall()
+        ]
+
+    unsorted = time_lookups(args.db, workout_ids)
+    report("unsorted", unsorted)
+    report_batched(time_batched(args.db, workout_ids), unsorted)
+
+    converter = HealthKitConverter(
+        zip_filepath=Path(),
+        sqlite_filepath=None,
+        duckdb_filepath=args.db,
+        tables_to_keep=["workouts", "workout_points"],
+    )
+    converter.cluster_workout_points()
+
+    clustered = time_lookups(args.db, workout_ids)
+    report("clustered", clustered)
+    report_batched(time_batched(args.db, workout_ids), clustered)
+
+
+if __name__ == "__main__":
+    main()
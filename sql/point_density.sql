@@ -0,0 +1,14 @@
+WITH pixels AS (
+    -- Web Mercator pixel of each point, in a world {world_pixels} pixels wide
+    SELECT
+        floor((longitude + 180) / 360 * {world_pixels})::BIGINT AS x,
+        floor((1 - asinh(tan(radians(latitude))) / pi()) / 2 * {world_pixels})::BIGINT AS y
+    FROM workout_points
+    WHERE latitude BETWEEN {min_latitude} AND {max_latitude}
+      AND longitude BETWEEN {min_longitude} AND {max_longitude}
+)
+SELECT x, y, count(*) AS point_count
+FROM pixels
+WHERE x BETWEEN {min_x} AND {max_x}
+  AND y BETWEEN {min_y} AND {max_y}
+GROUP BY x, y;
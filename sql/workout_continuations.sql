@@ -0,0 +1 @@
+SELECT * FROM workout_continuations;
@@ -1,2 +1,4 @@
-CREATE TABLE workout_points AS 
-SELECT * FROM workout_points;
+SELECT *
+FROM workout_points
+WHERE workout_id = '{workout_id}'
+ORDER BY date;
@@ -0,0 +1,4 @@
+SELECT wp.*
+FROM workout_points wp
+SEMI JOIN requested_workouts r ON wp.workout_id = r.workout_id
+ORDER BY wp.workout_id, wp.date;
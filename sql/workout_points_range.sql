@@ -0,0 +1,4 @@
+SELECT *
+FROM workout_points
+WHERE rowid BETWEEN {first_row} AND {last_row}
+  AND workout_id = '{workout_id}';
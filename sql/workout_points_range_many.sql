@@ -0,0 +1,6 @@
+SELECT wp.*
+FROM workout_points wp
+JOIN requested_workouts r
+  ON wp.workout_id = r.workout_id
+ AND wp.rowid BETWEEN r.first_row AND r.last_row
+ORDER BY wp.workout_id, wp.date;
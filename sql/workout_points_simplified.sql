@@ -0,0 +1,5 @@
+SELECT *
+FROM workout_points_simplified
+WHERE workout_id = '{workout_id}'
+  AND significance_m >= {tolerance_m}
+ORDER BY date;
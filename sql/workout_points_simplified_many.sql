@@ -0,0 +1,5 @@
+SELECT wp.*
+FROM workout_points_simplified wp
+SEMI JOIN requested_workouts r ON wp.workout_id = r.workout_id
+WHERE wp.significance_m >= {tolerance_m}
+ORDER BY wp.workout_id, wp.date;
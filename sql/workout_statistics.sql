@@ -0,0 +1,4 @@
+SELECT *
+FROM workout_statistics
+WHERE workout_id = '{workout_id}'
+ORDER BY statistic_type;
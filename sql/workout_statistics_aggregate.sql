@@ -0,0 +1,15 @@
+SELECT
+    s.statistic_type,
+    s.unit,
+    count(DISTINCT s.workout_id) AS workouts,
+    sum(s.sum) AS total,
+    avg(s.average) AS average,
+    min(s.minimum) AS minimum,
+    max(s.maximum) AS maximum
+FROM workout_statistics s
+JOIN workouts w ON s.workout_id = w.id
+WHERE w.startDate >= '{start_date}'
+  AND w.startDate <= '{end_date}'
+  AND w.duration > {min_duration}
+GROUP BY ALL
+ORDER BY s.statistic_type, s.unit;
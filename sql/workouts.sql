@@ -1,3 +1,5 @@
-CREATE TABLE workouts AS 
-SELECT *, uuid() AS workout_uuid 
-FROM workouts;
+SELECT *
+FROM workouts
+WHERE startDate >= '{start_date}'
+  AND startDate <= '{end_date}'
+  AND duration > {min_duration};
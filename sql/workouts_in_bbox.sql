@@ -0,0 +1,8 @@
+SELECT workout_id, sum(point_count) AS point_count
+FROM workout_grid
+WHERE max_latitude >= {min_latitude}
+  AND min_latitude <= {max_latitude}
+  AND max_longitude >= {min_longitude}
+  AND min_longitude <= {max_longitude}
+GROUP BY workout_id
+ORDER BY workout_id;
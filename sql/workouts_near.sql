@@ -0,0 +1,25 @@
+WITH cells AS (
+    -- The point of each cell's track extent closest to the target
+    SELECT
+        workout_id,
+        least(greatest({latitude}, min_latitude), max_latitude) AS near_latitude,
+        least(greatest({longitude}, min_longitude), max_longitude) AS near_longitude
+    FROM workout_grid
+    WHERE max_latitude >= {min_latitude}
+      AND min_latitude <= {max_latitude}
+      AND max_longitude >= {min_longitude}
+      AND min_longitude <= {max_longitude}
+)
+SELECT
+    workout_id,
+    min(
+        2 * {earth_radius_km} * asin(sqrt(
+            pow(sin(radians(near_latitude - {latitude}) / 2), 2)
+            + cos(radians({latitude})) * cos(radians(near_latitude))
+            * pow(sin(radians(near_longitude - {longitude}) / 2), 2)
+        ))
+    ) AS distance_km
+FROM cells
+GROUP BY workout_id
+HAVING distance_km <= {radius_km}
+ORDER BY distance_km;
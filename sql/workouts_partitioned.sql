@@ -0,0 +1,7 @@
+SELECT * EXCLUDE (year, month)
+FROM workouts
+WHERE (year > {start_year} OR (year = {start_year} AND month >= {start_month}))
+  AND (year < {end_year} OR (year = {end_year} AND month <= {end_month}))
+  AND startDate >= '{start_date}'
+  AND startDate <= '{end_date}'
+  AND duration > {min_duration};
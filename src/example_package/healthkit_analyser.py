@@ -1,23 +1,56 @@
 from pathlib import Path
+import base64
+from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import date, timedelta
+import hashlib
+import html
+import itertools
+import json
+import numbers
+import os
+import queue
+import re
+import shutil
+import struct
+import threading
+import time
 import tomllib
-from typing import Dict, Any, List, Optional
-from functools import cache
+import zlib
+from collections import OrderedDict, deque
+from typing import Dict, Any, Callable, Hashable, Iterator, List, Optional, Tuple
 import duckdb
+import branca.colormap
 import folium
+from branca.element import MacroElement, Template
+import numpy as np
 import pandas as pd
 from loguru import logger
 
 
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = 111.195
+
+
 # ### Configuration Management
 @dataclass
 class HealthKitConfig:
     db_path: Path = Path("data/healthkit-transformed_2024_12_08.duckdb")
     sql_dir: Path = Path("sql")
     cache_dir: Path = Path("cache")
+    tile_dir: Path = Path("tiles")  # TilePyramid output
     min_duration: int = 20
     map_defaults: Dict[str, Any] = None
     cache_backend: str = "memory"  # memory|disk
+    cache_max_bytes: int = (
+        512 * 2**20
+    )  # disk backend: evict least recently used beyond this
+    memory_cache_max_bytes: int = (
+        256 * 2**20
+    )  # in-process results, evicted LRU beyond this
+    map_cache_max_bytes: int = 256 * 2**20  # rendered map pages under cache_dir/maps
+    parquet_path: Optional[Path] = None  # read a Parquet dataset instead of db_path
+    max_cursors: int = 4  # concurrent queries on the shared connection
 
     @classmethod
     def from_toml(cls, toml_path: Path = Path("config.toml")):
@@ -27,72 +60,1826 @@ class HealthKitConfig:
             db_path=Path(config_data["paths"]["database"]),
             sql_dir=Path(config_data["paths"]["sql"]),
             cache_dir=Path(config_data["paths"]["cache"]),
+            tile_dir=Path(config_data["paths"].get("tiles", "tiles")),
             min_duration=config_data["parameters"]["min_duration"],
             map_defaults=config_data["map_defaults"],
             cache_backend=config_data["caching"]["backend"],
+            cache_max_bytes=config_data["caching"].get("max_size_mb", 512) * 2**20,
+            memory_cache_max_bytes=config_data["caching"].get("memory_max_size_mb", 256)
+            * 2**20,
+            map_cache_max_bytes=config_data["caching"].get("map_max_size_mb", 256)
+            * 2**20,
+            parquet_path=(
+                Path(config_data["paths"]["parquet"])
+                if "parquet" in config_data["paths"]
+                else None
+            ),
+            max_cursors=config_data["parameters"].get("max_cursors", 4),
         )
 
 
 # ### SQL Management
+# A '{name}' or {name} placeholder in a sql/*.sql file
+PLACEHOLDER_PATTERN = re.compile(r"'\{(\w+)\}'|\{(\w+)\}")
+
+
 class SQLManager:
+    """
+    Named queries from ``sql/*.sql``.
+
+    Placeholders are rewritten once, at load time, into DuckDB ``$name`` parameters, so
+    a query is always the same SQL text and values are bound rather than spliced in,
+    including when the disk cache wraps it in DESCRIBE and COPY. ``get_query`` renders
+    a query with inlined literals, for reading or running it by hand.
+    """
+
     def __init__(self, sql_dir: Path):
         self.sql_dir = sql_dir
         self.queries = self._load_queries()
+        self.param_names = {
+            name: list(
+                dict.fromkeys(
+                    m.group(1) or m.group(2)
+                    for m in PLACEHOLDER_PATTERN.finditer(query)
+                )
+            )
+            for name, query in self.queries.items()
+        }
+        self.statements = {
+            name: PLACEHOLDER_PATTERN.sub(
+                lambda m: "$" + (m.group(1) or m.group(2)), query
+            )
+            for name, query in self.queries.items()
+        }
 
     def _load_queries(self) -> Dict[str, str]:
         return {fp.stem: fp.read_text() for fp in self.sql_dir.glob("*.sql")}
 
+    @staticmethod
+    def _literal(value: Any) -> str:
+        if value is None:
+            return "NULL"
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, numbers.Real):
+            return str(value)
+        return "'" + str(value).replace("'", "''") + "'"
+
     def get_query(self, name: str, params: Optional[Dict] = None) -> str:
-        query = self.queries[name]
-        return query.format(**(params or {}))
+        params = params or {}
+        return PLACEHOLDER_PATTERN.sub(
+            lambda m: self._literal(params[m.group(1) or m.group(2)]),
+            self.queries[name],
+        )
+
+    def bind(self, name: str, params: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        The subset of ``params`` the query uses (DuckDB rejects unused parameters).
+        """
+        params = params or {}
+        return {key: params[key] for key in self.param_names[name]}
+
+    def execute(
+        self, con: duckdb.DuckDBPyConnection, name: str, params: Optional[Dict] = None
+    ) -> duckdb.DuckDBPyConnection:
+        """
+        Run a named query with bound parameters; fetch the result from the returned
+        cursor.
+        """
+        return con.execute(self.statements[name], self.bind(name, params))
+
+
+# ### Connection Management
+class CursorPool:
+    """
+    Bounded pool of cursors on one long-lived DuckDB connection.
+
+    Each cursor is its own connection to the same database instance, so threads holding
+    different cursors query concurrently while sharing the catalog and buffer cache. At
+    most ``size`` cursors are created; further callers wait until one is handed back,
+    or until the pool is closed, when they raise instead.
+    """
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, size: int):
+        self.con = con
+        self.size = max(1, size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @contextmanager
+    def cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        cur = self._acquire()
+        try:
+            yield cur
+        finally:
+            if self._closed:
+                cur.close()
+            else:
+                self._idle.put(cur)
+
+    def _acquire(self) -> duckdb.DuckDBPyConnection:
+        if self._closed:
+            raise RuntimeError("The DuckDB connection has been closed")
+        try:
+            cur = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    return self.con.cursor()
+            cur = self._idle.get()
+        if cur is None:
+            # Closed while waiting: pass the wake-up on to the next waiter
+            self._idle.put(None)
+            raise RuntimeError("The DuckDB connection has been closed")
+        return cur
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                cur = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if cur is not None:
+                cur.close()
+        # Wake any caller waiting for a cursor
+        self._idle.put(None)
+        self.con.close()
+
+
+# ### Endpoint Matching
+def haversine_km(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """Element-wise great-circle distance in km between arrays of points in degrees."""
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def match_points(
+    ref_lat: np.ndarray,
+    ref_lon: np.ndarray,
+    cand_lat: np.ndarray,
+    cand_lon: np.ndarray,
+    max_distance_km: float,
+) -> tuple:
+    """
+    All (reference, candidate) pairs of points within ``max_distance_km`` of each other.
+
+    Candidates are sorted by latitude once and each reference only measures the
+    candidates in its latitude band (found with ``searchsorted``), so the work grows
+    with the number of close pairs rather than with references x candidates. Returns the
+    reference indices, candidate indices and distances as arrays.
+    """
+    ref_lat, ref_lon = (
+        np.asarray(ref_lat, dtype=np.float64),
+        np.asarray(ref_lon, dtype=np.float64),
+    )
+    order = np.argsort(cand_lat, kind="stable")
+    sorted_lat = np.asarray(cand_lat, dtype=np.float64)[order]
+    band = max_distance_km / KM_PER_DEGREE_LATITUDE
+    lo = np.searchsorted(sorted_lat, ref_lat - band, side="left")
+    hi = np.searchsorted(sorted_lat, ref_lat + band, side="right")
+    counts = hi - lo
+    ref_idx = np.repeat(np.arange(len(ref_lat)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cand_idx = order[lo[ref_idx] + offsets]
+    distances = haversine_km(
+        ref_lat[ref_idx],
+        ref_lon[ref_idx],
+        np.asarray(cand_lat)[cand_idx],
+        np.asarray(cand_lon)[cand_idx],
+    )
+    close = distances <= max_distance_km
+    return ref_idx[close], cand_idx[close], distances[close]
+
+
+# ### Continuation Graph
+class ContinuationGraph:
+    """
+    Directed graph of workouts that continue one another, from the converter's
+    workout_continuations edges (end of one workout near the start of a later one).
+
+    Edges point forward in time, so the graph is acyclic and chains can be found with a
+    single pass in topological order instead of repeated nearby-workout scans. Databases
+    converted before edges were strictly ordered can link zero-duration workouts both
+    ways; the edges closing such cycles are dropped on load.
+    """
+
+    def __init__(self, edges: pd.DataFrame):
+        self.successors: Dict[str, Dict[str, float]] = {}
+        self.predecessors: Dict[str, Dict[str, float]] = {}
+        for src, dst, distance in zip(
+            edges["from_workout_id"], edges["to_workout_id"], edges["distance_km"]
+        ):
+            self.successors.setdefault(src, {})[dst] = distance
+            self.predecessors.setdefault(dst, {})[src] = distance
+            self.successors.setdefault(dst, {})
+            self.predecessors.setdefault(src, {})
+        dropped = self._drop_cycles()
+        if dropped:
+            logger.warning(f"Ignored {dropped:,} workout continuations forming cycles.")
+        self.order = self._topological_order()
+
+    def _drop_cycles(self) -> int:
+        """
+        Remove the edges that close a cycle (back edges of a depth-first search),
+        returning how many.
+        """
+        # state[node] is 1 while node is on the search path and 2 once it is finished
+        state: Dict[str, int] = {}
+        back_edges = []
+        for root in self.successors:
+            if root in state:
+                continue
+            state[root] = 1
+            path = [(root, iter(self.successors[root]))]
+            while path:
+                node, successors = path[-1]
+                for succ in successors:
+                    if state.get(succ) == 1:
+                        back_edges.append((node, succ))
+                    elif succ not in state:
+                        state[succ] = 1
+                        path.append((succ, iter(self.successors[succ])))
+                        break
+                else:
+                    state[node] = 2
+                    path.pop()
+        for src, dst in back_edges:
+            del self.successors[src][dst]
+            del self.predecessors[dst][src]
+        return len(back_edges)
+
+    def _topological_order(self) -> List[str]:
+        indegree = {node: len(preds) for node, preds in self.predecessors.items()}
+        ready = deque(node for node, degree in indegree.items() if degree == 0)
+        order = []
+        while ready:
+            node = ready.popleft()
+            order.append(node)
+            for succ in self.successors[node]:
+                indegree[succ] -= 1
+                if indegree[succ] == 0:
+                    ready.append(succ)
+        return order
+
+    def longest_chain(self, start_id: Optional[str] = None) -> List[str]:
+        """
+        The chain with the most workouts, starting at ``start_id`` or anywhere. Ties go
+        to the chain with the shortest total joining distance.
+        """
+        # best[node] = (workouts in the best chain from node, -joining km, next node)
+        best: Dict[str, tuple] = {}
+        for node in reversed(self.order):
+            best[node] = (1, 0.0, None)
+            for succ, distance in self.successors[node].items():
+                length, neg_km, _ = best[succ]
+                candidate = (length + 1, neg_km - distance, succ)
+                if candidate[:2] > best[node][:2]:
+                    best[node] = candidate
+        if start_id is None:
+            if not best:
+                return []
+            start_id = max(best, key=lambda node: best[node][:2])
+        elif start_id not in best:
+            return [start_id]
+        chain = [start_id]
+        while best[chain[-1]][2] is not None:
+            chain.append(best[chain[-1]][2])
+        return chain
+
+    def shortest_chain(self, from_id: str, to_id: str) -> Optional[List[str]]:
+        """The chain with the fewest workouts from ``from_id`` to ``to_id``, or None."""
+        previous: Dict[str, Optional[str]] = {from_id: None}
+        pending = deque([from_id])
+        while pending:
+            node = pending.popleft()
+            if node == to_id:
+                chain = [node]
+                while previous[chain[-1]] is not None:
+                    chain.append(previous[chain[-1]])
+                return chain[::-1]
+            for succ in self.successors.get(node, {}):
+                if succ not in previous:
+                    previous[succ] = node
+                    pending.append(succ)
+        return None
+
+    def neighbourhood(
+        self, workout_id: str, hops: int = 1, direction: str = "both"
+    ) -> Dict[str, int]:
+        """
+        Workouts within ``hops`` edges (forward, backward or both), with their hop
+        count.
+        """
+        if direction not in ("forward", "backward", "both"):
+            raise ValueError(
+                f"direction must be 'forward', 'backward' or 'both', not '{direction}'"
+            )
+        seen = {workout_id: 0}
+        frontier = [workout_id]
+        for hop in range(1, hops + 1):
+            next_frontier = []
+            for node in frontier:
+                neighbours = []
+                if direction in ("forward", "both"):
+                    neighbours += self.successors.get(node, {})
+                if direction in ("backward", "both"):
+                    neighbours += self.predecessors.get(node, {})
+                for neighbour in neighbours:
+                    if neighbour not in seen:
+                        seen[neighbour] = hop
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        del seen[workout_id]
+        return seen
+
+    def journeys(self, min_workouts: int = 2) -> List[List[str]]:
+        """
+        Connected groups of workouts (ignoring edge direction) in time order, largest
+        first: each is one multi-day journey, possibly with alternative stages.
+        """
+        position = {node: i for i, node in enumerate(self.order)}
+        seen = set()
+        journeys = []
+        for node in self.order:
+            if node in seen:
+                continue
+            component, stack = [], [node]
+            seen.add(node)
+            while stack:
+                current = stack.pop()
+                component.append(current)
+                for neighbour in (
+                    *self.successors[current],
+                    *self.predecessors[current],
+                ):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        stack.append(neighbour)
+            if len(component) >= min_workouts:
+                journeys.append(sorted(component, key=position.__getitem__))
+        return sorted(journeys, key=len, reverse=True)
+
+
+# ### Result Formats
+# pandas DataFrame, pyarrow Table, dict of NumPy column arrays, or (n, 2) lat/lon array
+FORMATS = ("pandas", "arrow", "numpy", "coords")
+
+
+def fetch_result(con: duckdb.DuckDBPyConnection, format: str = "pandas") -> Any:
+    """
+    Fetch the pending result of ``con.execute`` in one of ``FORMATS``, using DuckDB's
+    Arrow/NumPy fetch paths. "coords" needs latitude and longitude columns.
+    """
+    if format == "pandas":
+        return con.df()
+    if format == "arrow":
+        # to_arrow_table() replaces fetch_arrow_table() from DuckDB 1.5
+        to_arrow = getattr(con, "to_arrow_table", None) or con.fetch_arrow_table
+        return to_arrow()
+    if format == "numpy":
+        return con.fetchnumpy()
+    if format == "coords":
+        return coords_array(con.fetchnumpy())
+    raise ValueError(f"Unknown format '{format}', expected one of {FORMATS}")
+
+
+def coords_array(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Pack latitude/longitude columns into a contiguous (n, 2) float array."""
+    if not {"latitude", "longitude"} <= columns.keys():
+        raise ValueError(
+            "format='coords' needs latitude and longitude columns, which only the "
+            "workout_points and workout_points_simplified tables have "
+            "(get_workout_points, get_workout_points_many)"
+        )
+    return np.column_stack([columns["latitude"], columns["longitude"]]).astype(
+        np.float64
+    )
+
+
+def slice_result(result: Any, start: int, end: int) -> Any:
+    """
+    Rows ``start:end`` of a result in any of ``FORMATS``, copied into memory of their
+    own. A view (even ``iloc`` followed by ``copy``, for Arrow-backed string columns)
+    keeps the whole result alive while reporting only its own rows' size.
+    """
+    if isinstance(result, dict):
+        return {column: values[start:end].copy() for column, values in result.items()}
+    if isinstance(result, np.ndarray):
+        return result[start:end].copy()
+    # A DataFrame or an Arrow table, whose take() copies the rows out
+    return result.take(np.arange(start, end))
+
+
+# ### Result Caching
+def result_nbytes(value: Any) -> int:
+    """
+    Memory held by a query result: DataFrames (deep), Arrow tables, arrays or dicts of
+    arrays.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sum(result_nbytes(v) for v in value.values())
+    nbytes = getattr(value, "nbytes", None)
+    return int(nbytes) if nbytes is not None else 0
+
+
+class MemoryCache:
+    """
+    In-process LRU cache of query results, bounded by their size in bytes.
+
+    One instance can be shared by several analysers (e.g. all sessions of a dashboard);
+    keys start with an owner token so each analyser can drop just its own entries.
+    Results larger than the whole budget are not stored. Entries are counted by their
+    own size, so they should not be views of a larger result (see ``slice_result``).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        nbytes = result_nbytes(value)
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def invalidate(self, owner: Optional[Hashable] = None):
+        """Drop every entry, or only those whose key starts with ``owner``."""
+        with self._lock:
+            for key in [k for k in self._entries if owner is None or k[0] == owner]:
+                self._discard(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+            }
+
+
+def cache_entries(cache_dir: Path, pattern: str) -> List[tuple]:
+    """
+    ``(path, stat)`` of the files in a cache directory, skipping any deleted meanwhile.
+    """
+    entries = []
+    for fp in cache_dir.glob(pattern):
+        try:
+            entries.append((fp, fp.stat()))
+        except FileNotFoundError:
+            pass
+    return entries
+
+
+def evict_lru(entries: List[tuple], max_bytes: int, keep: Path) -> int:
+    """
+    Delete the least recently used (oldest mtime) entries beyond ``max_bytes``,
+    returning how many.
+    """
+    entries = sorted(entries, key=lambda entry: entry[1].st_mtime_ns)
+    total = sum(stat.st_size for _, stat in entries)
+    evicted = 0
+    for fp, stat in entries:
+        if total <= max_bytes:
+            break
+        if fp == keep:
+            continue
+        fp.unlink(missing_ok=True)
+        total -= stat.st_size
+        evicted += 1
+    return evicted
+
+
+class DiskCache:
+    """
+    Query results stored as Parquet files under ``cache_dir``, so they survive restarts.
+
+    Entries are keyed by query name, parameters and a fingerprint of the data source, so
+    a rebuilt database never serves stale results. Files are written straight from the
+    query with DuckDB ``COPY`` and carry the DuckDB column types in their metadata,
+    which lets ENUM columns come back as categoricals. Once the directory exceeds
+    ``max_bytes`` the least recently used files (by mtime, refreshed on every hit) are
+    evicted.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int, fingerprint: str):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, name: str, params: Dict) -> Path:
+        key = json.dumps(
+            {"query": name, "params": params, "source": self.fingerprint},
+            sort_keys=True,
+            default=str,
+        )
+        return (
+            self.cache_dir
+            / f"{name}-{hashlib.sha256(key.encode()).hexdigest()[:32]}.parquet"
+        )
+
+    def get(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        name: str,
+        params: Dict,
+        format: str = "pandas",
+    ) -> Optional[Any]:
+        path = self.path(name, params)
+        if not path.exists():
+            self.misses += 1
+            return None
+        try:
+            df = self.read(con, name, params, format)
+        except duckdb.IOException:
+            # Evicted by another process since the check
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process after the read, which still succeeded
+            pass
+        self.hits += 1
+        return df
+
+    def put(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        name: str,
+        params: Dict,
+        query: str,
+        query_params: Optional[Dict] = None,
+    ):
+        """
+        Store the result of ``query``, run with ``query_params`` bound, as the entry for
+        ``name``/``params``.
+        """
+        path = self.path(name, params)
+        query = query.strip().rstrip(";")
+        types = json.dumps(
+            {
+                column: column_type
+                for column, column_type, *_ in con.execute(
+                    f"DESCRIBE {query}", query_params
+                ).fetchall()
+            }
+        )
+        tmp_path = path.with_name(
+            f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        con.execute(
+            f"""
+            COPY ({query}) TO '{tmp_path}' (
+                FORMAT parquet,
+                COMPRESSION zstd,
+                KV_METADATA {{duckdb_types: '{types.replace("'", "''")}'}}
+            )
+            """,
+            query_params,
+        )
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def read(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        name: str,
+        params: Dict,
+        format: str = "pandas",
+    ) -> Any:
+        """
+        Read an entry that is known to exist, without touching the hit/miss counters.
+        """
+        path = self.path(name, params)
+        (types,) = con.execute(
+            "SELECT decode(value) FROM parquet_kv_metadata(?) "
+            "WHERE decode(key) = 'duckdb_types'",
+            [str(path)],
+        ).fetchone()
+        columns = ", ".join(
+            f'CAST("{column}" AS {column_type}) AS "{column}"'
+            for column, column_type in json.loads(types).items()
+        )
+        return fetch_result(
+            con.execute(f"SELECT {columns} FROM read_parquet(?)", [str(path)]), format
+        )
+
+    def _entries(self) -> List[tuple]:
+        return cache_entries(self.cache_dir, "*.parquet")
+
+    def _evict(self, keep: Path):
+        self.evictions += evict_lru(self._entries(), self.max_bytes, keep)
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+        }
+
+
+class MapCache:
+    """
+    Rendered map pages stored as ``{sha256}.html`` under ``cache_dir``, named by a hash
+    of everything that goes into them (the map's inputs, its style and the data source),
+    so a repeat render is a file read. Beyond ``max_bytes`` the least recently used
+    pages are evicted, as in DiskCache.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: Dict) -> Path:
+        digest = hashlib.sha256(
+            json.dumps(key, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return self.cache_dir / f"{digest}.html"
+
+    def get(self, key: Dict) -> Optional[Path]:
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key: Dict, page: str) -> Path:
+        path = self.path(key)
+        tmp_path = path.with_name(
+            f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        tmp_path.write_text(page, encoding="utf-8")
+        os.replace(tmp_path, path)
+        self.evictions += evict_lru(
+            cache_entries(self.cache_dir, "*.html"), self.max_bytes, path
+        )
+        return path
+
+    def stats(self) -> Dict[str, int]:
+        entries = cache_entries(self.cache_dir, "*.html")
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+        }
 
 
 class HealthKitAnalyser:
-    def __init__(self, config: Optional[HealthKitConfig] = None):
+    _owners = itertools.count()
+
+    def __init__(
+        self,
+        config: Optional[HealthKitConfig] = None,
+        memory_cache: Optional[MemoryCache] = None,
+    ):
         self.config = config or HealthKitConfig.from_toml()
         self.sql_mgr = SQLManager(self.config.sql_dir)
+        # Pass one MemoryCache to several analysers to share a single budget
+        self.memory_cache = memory_cache or MemoryCache(
+            self.config.memory_cache_max_bytes
+        )
+        self._cache_owner = next(self._owners)
         self._init_cache()
+        self._pool = CursorPool(self._open(), self.config.max_cursors)
         self._validate_db()
+        self._point_ranges = self._load_point_ranges()
+        self._continuation_graphs: Dict[tuple, ContinuationGraph] = {}
 
     def _init_cache(self):
+        self.disk_cache: Optional[DiskCache] = None
         if self.config.cache_backend == "disk":
-            self.config.cache_dir.mkdir(exist_ok=True)
+            self.disk_cache = DiskCache(
+                self.config.cache_dir,
+                self.config.cache_max_bytes,
+                self._source_fingerprint(),
+            )
+
+    def _source_fingerprint(self) -> str:
+        """
+        Identify the current database file or Parquet dataset by size and modification
+        time.
+        """
+        if self.config.parquet_path is None:
+            files = [self.config.db_path]
+        else:
+            files = sorted(self.config.parquet_path.rglob("*.parquet"))
+        stats = [(str(fp), fp.stat().st_size, fp.stat().st_mtime_ns) for fp in files]
+        return hashlib.sha256(json.dumps(stats).encode()).hexdigest()
+
+    def _open(self) -> duckdb.DuckDBPyConnection:
+        """
+        Open the DuckDB database read-only, or an in-memory connection with views over
+        the Parquet dataset. The connection lives as long as the analyser.
+        """
+        if self.config.parquet_path is None:
+            return duckdb.connect(database=str(self.config.db_path), read_only=True)
+        con = duckdb.connect()
+        for table in ("workouts", "workout_points"):
+            # Keep the year/month partition columns on workouts so date-range
+            # queries can prune whole partitions
+            columns = "*" if table == "workouts" else "* EXCLUDE (year, month)"
+            con.execute(f"""
+                CREATE VIEW {table} AS
+                SELECT {columns}
+                FROM read_parquet(
+                    '{self.config.parquet_path / table}/**/*.parquet',
+                    hive_partitioning = true
+                )
+            """)
+        # Derived per-workout tables are exported as single files
+        for fp in self.config.parquet_path.glob("*.parquet"):
+            con.execute(f"CREATE VIEW {fp.stem} AS SELECT * FROM read_parquet('{fp}')")
+        return con
+
+    def _cursor(self):
+        """
+        Borrow a cursor on the shared connection for the duration of a ``with`` block.
+        """
+        return self._pool.cursor()
+
+    def close(self):
+        """Close the shared connection; the analyser can no longer query afterwards."""
+        self._pool.close()
+
+    def __enter__(self) -> "HealthKitAnalyser":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _memory_key(self, name: str, params: Dict, format: str = "pandas") -> tuple:
+        return (
+            self._cache_owner,
+            name,
+            json.dumps(params, sort_keys=True, default=str),
+            format,
+        )
+
+    def _query(
+        self,
+        name: str,
+        params: Optional[Dict] = None,
+        cache_key: Optional[tuple] = None,
+        format: str = "pandas",
+    ) -> Any:
+        """
+        Run a named query through the memory cache and, when that backend is configured,
+        the disk cache, returning it in one of ``FORMATS``. ``cache_key`` (name, params)
+        overrides the entry the result is stored under.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format '{format}', expected one of {FORMATS}")
+        params = params or {}
+        key_name, key_params = cache_key or (name, params)
+        memory_key = self._memory_key(key_name, key_params, format)
+        result = self.memory_cache.get(memory_key)
+        if result is not None:
+            return result
+        with self._cursor() as con:
+            if self.disk_cache is None:
+                result = fetch_result(self.sql_mgr.execute(con, name, params), format)
+            else:
+                result = self.disk_cache.get(con, key_name, key_params, format)
+                if result is None:
+                    self.disk_cache.put(
+                        con,
+                        key_name,
+                        key_params,
+                        self.sql_mgr.statements[name],
+                        self.sql_mgr.bind(name, params),
+                    )
+                    result = self.disk_cache.read(con, key_name, key_params, format)
+        self.memory_cache.put(memory_key, result)
+        return result
+
+    def invalidate_cache(self):
+        """
+        Drop this analyser's results from the memory cache (disk entries follow the
+        source fingerprint).
+        """
+        self.memory_cache.invalidate(self._cache_owner)
+        self._continuation_graphs.clear()
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Hit/miss/eviction counters and sizes of the memory cache and, if enabled, the
+        disk cache.
+        """
+        stats = {"memory": self.memory_cache.stats()}
+        if self.disk_cache is not None:
+            stats["disk"] = self.disk_cache.stats()
+        return stats
 
     def _validate_db(self):
         required_tables = ["workouts", "workout_points"]
-        with duckdb.connect(database=str(self.config.db_path)) as con:
+        with self._cursor() as con:
             tables = con.execute("SHOW TABLES;").fetchall()
         existing_tables = [t[0] for t in tables]
+        self.tables = set(existing_tables)
         missing = set(required_tables) - set(existing_tables)
         if missing:
             logger.error(f"Missing required tables: {missing}")
             raise ValueError("Invalid HealthKit database structure")
 
-    @cache
-    def get_workouts(self, start_date: str, end_date: str) -> pd.DataFrame:
-        query = self.sql_mgr.get_query(
-            "workouts",
+    def _load_point_ranges(self) -> Dict[str, tuple]:
+        """Load the converter's per-workout rowid directory, if the database has one."""
+        if self.config.parquet_path is not None:
+            return {}
+        with self._cursor() as con:
+            tables = {t[0] for t in con.execute("SHOW TABLES;").fetchall()}
+            if "workout_point_ranges" not in tables:
+                return {}
+            rows = con.execute(
+                "SELECT workout_id, first_row, last_row FROM workout_point_ranges"
+            ).fetchall()
+        return {workout_id: (first, last) for workout_id, first, last in rows}
+
+    @staticmethod
+    def _year_month(day: str, offset_days: int) -> Tuple[int, int]:
+        # Partitions follow the workout's UTC start date, so widen the range by
+        # a day either side to cover any timezone difference
+        d = date.fromisoformat(day[:10]) + timedelta(days=offset_days)
+        return d.year, d.month
+
+    def get_workouts(
+        self, start_date: str, end_date: str, format: str = "pandas"
+    ) -> Any:
+        """
+        Workouts in a date range; ``format`` is one of ``FORMATS`` (default pandas).
+        """
+        params = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "min_duration": self.config.min_duration,
+        }
+        if self.config.parquet_path is None:
+            return self._query("workouts", params, format=format)
+        # Compared column by column (not as year * 100 + month) so DuckDB can prune
+        # Hive partitions from the year=/month= directory values
+        params["start_year"], params["start_month"] = self._year_month(start_date, -1)
+        params["end_year"], params["end_month"] = self._year_month(end_date, 1)
+        return self._query("workouts_partitioned", params, format=format)
+
+    def get_workout_points(
+        self,
+        workout_id: str,
+        format: str = "pandas",
+        tolerance_m: Optional[float] = None,
+    ) -> Any:
+        """
+        The points of one workout in date order. ``format="coords"`` returns a packed
+        ``(n, 2)`` float array of latitude/longitude, skipping pandas altogether. With
+        ``tolerance_m``, only the points of the track simplified to that many metres are
+        returned, from the converter's workout_points_simplified table.
+        """
+        if tolerance_m is not None:
+            self._require_table("workout_points_simplified")
+            return self._query(
+                "workout_points_simplified",
+                {"workout_id": workout_id, "tolerance_m": float(tolerance_m)},
+                format=format,
+            )
+        # Range and plain lookups return the same rows, so share one disk cache entry
+        cache_key = ("workout_points", {"workout_id": workout_id})
+        if workout_id in self._point_ranges:
+            # workout_points is clustered by (workout_id, date), so this is a single
+            # range read that already comes back in date order
+            first_row, last_row = self._point_ranges[workout_id]
+            return self._query(
+                "workout_points_range",
+                {
+                    "workout_id": workout_id,
+                    "first_row": first_row,
+                    "last_row": last_row,
+                },
+                cache_key=cache_key,
+                format=format,
+            )
+        return self._query(
+            "workout_points",
+            {"workout_id": workout_id},
+            cache_key=cache_key,
+            format=format,
+        )
+
+    def get_workout_points_many(
+        self,
+        workout_ids: List[str],
+        format: str = "pandas",
+        tolerance_m: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Points of several workouts, fetched in one query and keyed by workout id.
+
+        Each value holds that workout's rows of the single result, copied out so the
+        cache can count its size, in the requested ``format``. It is stored in the
+        per-workout cache, so later ``get_workout_points`` calls are free. Workouts
+        without points map to an empty result. With the disk backend, cached workouts
+        are read from disk and the rest are stored there one entry per workout.
+        ``tolerance_m`` simplifies every track as in ``get_workout_points``.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format '{format}', expected one of {FORMATS}")
+        name, params = "workout_points", {}
+        if tolerance_m is not None:
+            self._require_table("workout_points_simplified")
+            name, params = (
+                "workout_points_simplified",
+                {"tolerance_m": float(tolerance_m)},
+            )
+
+        def point_params(wid: str) -> Dict[str, Any]:
+            return {"workout_id": wid, **params}
+
+        def memory_key(wid: str) -> tuple:
+            return self._memory_key(name, point_params(wid), format)
+
+        found: Dict[str, Any] = {}
+        for wid in dict.fromkeys(workout_ids):
+            cached = self.memory_cache.get(memory_key(wid))
+            if cached is not None:
+                found[wid] = cached
+        missing = [wid for wid in dict.fromkeys(workout_ids) if wid not in found]
+        loaded = list(missing)
+        if missing and self.disk_cache is not None:
+            with self._cursor() as con:
+                for wid in missing:
+                    cached = self.disk_cache.get(con, name, point_params(wid), format)
+                    if cached is not None:
+                        found[wid] = cached
+            missing = [wid for wid in missing if wid not in found]
+        if missing:
+            requested = pd.DataFrame({"workout_id": missing})
+            query_name = f"{name}_many"
+            if tolerance_m is None and all(
+                wid in self._point_ranges for wid in missing
+            ):
+                # Joined on workout_id as well as the rowid range, so DuckDB can skip
+                # row groups by the zone maps of the clustered workout_id column
+                query_name = "workout_points_range_many"
+                requested["first_row"], requested["last_row"] = zip(
+                    *(self._point_ranges[wid] for wid in missing)
+                )
+            with self._cursor() as con:
+                con.register("requested_workouts", requested)
+                try:
+                    if self.disk_cache is None:
+                        result = self.sql_mgr.execute(con, query_name, params)
+                    else:
+                        con.execute(
+                            "CREATE OR REPLACE TEMP TABLE requested_points AS "
+                            + self.sql_mgr.statements[query_name].rstrip().rstrip(";"),
+                            self.sql_mgr.bind(query_name, params),
+                        )
+                        for wid in missing:
+                            self.disk_cache.put(
+                                con,
+                                name,
+                                point_params(wid),
+                                "SELECT * FROM requested_points "
+                                "WHERE workout_id = $workout_id ORDER BY date",
+                                {"workout_id": wid},
+                            )
+                        result = con.execute(
+                            "SELECT * FROM requested_points ORDER BY workout_id, date"
+                        )
+                    if format == "coords":
+                        columns = result.fetchnumpy()
+                        ids = columns["workout_id"]
+                        points = coords_array(columns)
+                    else:
+                        points = fetch_result(result, format)
+                        ids = points["workout_id"]
+                        ids = (
+                            ids.to_numpy()
+                            if hasattr(ids, "to_numpy")
+                            else np.asarray(ids)
+                        )
+                    if self.disk_cache is not None:
+                        con.execute("DROP TABLE requested_points")
+                finally:
+                    con.unregister("requested_workouts")
+            # Rows are ordered by workout_id, so each workout is one contiguous slice
+            workouts, starts, counts = np.unique(
+                ids, return_index=True, return_counts=True
+            )
+            for wid, start, count in zip(workouts, starts, counts):
+                found[str(wid)] = slice_result(points, int(start), int(start + count))
+            for wid in missing:
+                found.setdefault(wid, slice_result(points, 0, 0))
+        for wid in loaded:
+            self.memory_cache.put(memory_key(wid), found[wid])
+        return {wid: found[wid] for wid in workout_ids}
+
+    def _workout_summaries(self) -> pd.DataFrame:
+        return self._query("workout_summary")
+
+    def get_workout_summaries(
+        self, workout_ids: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Per-workout start/end, bounding box, point count, distance, elevation gain and
+        moving time from the converter's workout_summary table, optionally limited to
+        some workouts.
+        """
+        self._require_table("workout_summary")
+        summaries = self._workout_summaries()
+        if workout_ids is None:
+            return summaries
+        return summaries[summaries["workout_id"].isin(workout_ids)]
+
+    def _require_table(self, table: str):
+        if table not in self.tables:
+            raise ValueError(f"Database has no {table} table; re-run the converter.")
+
+    def workouts_in_bbox(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        format: str = "pandas",
+    ) -> Any:
+        """
+        Workouts whose track passes through a latitude/longitude box, with the number of
+        their points in the grid cells it touches. Answered from the converter's
+        workout_grid index, to the precision of the track's extent within each cell.
+        """
+        self._require_table("workout_grid")
+        params = {
+            "min_latitude": min_latitude,
+            "min_longitude": min_longitude,
+            "max_latitude": max_latitude,
+            "max_longitude": max_longitude,
+        }
+        return self._query("workouts_in_bbox", params, format=format)
+
+    def workouts_near(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        format: str = "pandas",
+    ) -> Any:
+        """
+        Workouts whose track comes within ``radius_km`` of a point, nearest first, with
+        the great-circle distance to the track's extent in the closest workout_grid
+        cell.
+        """
+        self._require_table("workout_grid")
+        lat_margin = radius_km / KM_PER_DEGREE_LATITUDE
+        lon_margin = radius_km / (
+            KM_PER_DEGREE_LATITUDE * max(float(np.cos(np.radians(latitude))), 1e-6)
+        )
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "radius_km": radius_km,
+            "earth_radius_km": EARTH_RADIUS_KM,
+            "min_latitude": latitude - lat_margin,
+            "max_latitude": latitude + lat_margin,
+            "min_longitude": longitude - lon_margin,
+            "max_longitude": longitude + lon_margin,
+        }
+        return self._query("workouts_near", params, format=format)
+
+    def point_density(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        zoom: int,
+    ) -> Tuple[np.ndarray, List[List[float]]]:
+        """
+        Workout points counted per Web Mercator pixel at ``zoom``, over the tiles
+        covering a latitude/longitude box, and the ``[[south, west], [north, east]]``
+        bounds of that grid.
+
+        DuckDB aggregates the counts; they are cached per tile, so panning only queries
+        the tiles that come into view and going back to a zoom level queries nothing.
+        """
+        box = pd.DataFrame(
+            [[min_latitude, min_longitude, max_latitude, max_longitude]],
+            columns=["min_latitude", "min_longitude", "max_latitude", "max_longitude"],
+        )
+        x0, x1, y0, y1 = (int(value) for value in tile_bounds(box, zoom)[0])
+
+        def memory_key(x: int, y: int) -> tuple:
+            return self._memory_key(
+                "point_density", {"zoom": zoom, "tile": [x, y]}, "numpy"
+            )
+
+        tiles = {
+            (x, y): self.memory_cache.get(memory_key(x, y))
+            for x in range(x0, x1 + 1)
+            for y in range(y0, y1 + 1)
+        }
+        missing = [tile for tile, counts in tiles.items() if counts is None]
+        if missing:
+            # One query over the rectangle of missing tiles, split per tile
+            mx0, mx1 = min(x for x, _ in missing), max(x for x, _ in missing)
+            my0, my1 = min(y for _, y in missing), max(y for _, y in missing)
+            (north, west), (south, east) = mercator_coords(
+                np.array([[mx0, my0], [mx1 + 1, my1 + 1]]) * TILE_SIZE, zoom
+            )
+            params = {
+                "world_pixels": TILE_SIZE * 2**zoom,
+                "min_latitude": float(south),
+                "max_latitude": float(north),
+                "min_longitude": float(west),
+                "max_longitude": float(east),
+                "min_x": mx0 * TILE_SIZE,
+                "max_x": (mx1 + 1) * TILE_SIZE - 1,
+                "min_y": my0 * TILE_SIZE,
+                "max_y": (my1 + 1) * TILE_SIZE - 1,
+            }
+            with self._cursor() as con:
+                columns = self.sql_mgr.execute(
+                    con, "point_density", params
+                ).fetchnumpy()
+            x, y = columns["x"], columns["y"]
+            tile = (x // TILE_SIZE) * 2**zoom + y // TILE_SIZE
+            order = np.argsort(tile, kind="stable")
+            tile, pixel, count = (
+                tile[order],
+                ((y % TILE_SIZE) * TILE_SIZE + x % TILE_SIZE)[order].astype(np.uint16),
+                columns["point_count"][order],
+            )
+            for x, y in missing:
+                first, last = np.searchsorted(
+                    tile, [x * 2**zoom + y, x * 2**zoom + y + 1]
+                )
+                counts = {"pixel": pixel[first:last], "count": count[first:last]}
+                self.memory_cache.put(memory_key(x, y), counts)
+                tiles[(x, y)] = counts
+
+        grid = np.zeros(
+            ((y1 - y0 + 1) * TILE_SIZE, (x1 - x0 + 1) * TILE_SIZE), dtype=np.int64
+        )
+        for (x, y), counts in tiles.items():
+            block = grid[
+                (y - y0) * TILE_SIZE : (y - y0 + 1) * TILE_SIZE,
+                (x - x0) * TILE_SIZE : (x - x0 + 1) * TILE_SIZE,
+            ]
+            block[counts["pixel"] // TILE_SIZE, counts["pixel"] % TILE_SIZE] = counts[
+                "count"
+            ]
+        (north, west), (south, east) = mercator_coords(
+            np.array([[x0, y0], [x1 + 1, y1 + 1]]) * TILE_SIZE, zoom
+        )
+        return grid, [[float(south), float(west)], [float(north), float(east)]]
+
+    def find_nearby_workouts(
+        self,
+        reference_ids,
+        ref_location: str = "start",
+        max_distance_km: float = 1.0,
+        workout_ids: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Workouts that connect to one or more reference workouts.
+
+        With ``ref_location="start"`` a reference's start is matched against the end of
+        every other workout (walks that finish where the reference begins); with "end"
+        its end is matched against their start. ``workout_ids`` limits the candidates.
+        Endpoints come from workout_summary and distances are computed with vectorized
+        NumPy. Returns reference_id, workout_id and distance_km, nearest first per
+        reference, in the order the references were given.
+        """
+        if ref_location not in ("start", "end"):
+            raise ValueError(
+                f"ref_location must be 'start' or 'end', not '{ref_location}'"
+            )
+        if isinstance(reference_ids, str):
+            reference_ids = [reference_ids]
+        summaries = self.get_workout_summaries()
+        references = (
+            summaries.set_index("workout_id")
+            .reindex(list(reference_ids))
+            .dropna(subset=[f"{ref_location}_latitude"])
+        )
+        candidates = (
+            summaries
+            if workout_ids is None
+            else self.get_workout_summaries(workout_ids)
+        )
+        other = "end" if ref_location == "start" else "start"
+
+        ref_idx, cand_idx, distances = match_points(
+            references[f"{ref_location}_latitude"].to_numpy(),
+            references[f"{ref_location}_longitude"].to_numpy(),
+            candidates[f"{other}_latitude"].to_numpy(),
+            candidates[f"{other}_longitude"].to_numpy(),
+            max_distance_km,
+        )
+        matches = pd.DataFrame(
+            {
+                "reference_id": references.index.to_numpy()[ref_idx],
+                "workout_id": candidates["workout_id"].to_numpy()[cand_idx],
+                "distance_km": distances,
+                "_reference_order": ref_idx,
+            }
+        )
+        matches = matches[matches["reference_id"] != matches["workout_id"]]
+        return (
+            matches.sort_values(["_reference_order", "distance_km"], kind="stable")
+            .drop(columns="_reference_order")
+            .reset_index(drop=True)
+        )
+
+    def continuation_graph(
+        self,
+        max_distance_km: Optional[float] = None,
+        max_gap_hours: Optional[float] = None,
+    ) -> ContinuationGraph:
+        """
+        The graph of workouts continuing one another, optionally with tighter distance
+        and time-gap limits than the converter's. Built once per limits and kept.
+        """
+        self._require_table("workout_continuations")
+        key = (max_distance_km, max_gap_hours)
+        if key not in self._continuation_graphs:
+            edges = self._query("workout_continuations")
+            if max_distance_km is not None:
+                edges = edges[edges["distance_km"] <= max_distance_km]
+            if max_gap_hours is not None:
+                edges = edges[edges["gap_hours"] <= max_gap_hours]
+            self._continuation_graphs[key] = ContinuationGraph(edges)
+        return self._continuation_graphs[key]
+
+    def get_workout_statistics(self, workout_id: str) -> pd.DataFrame:
+        """
+        The typed WorkoutStatistics rows (type, sum/average/minimum/maximum, unit) of
+        one workout.
+        """
+        self._require_table("workout_statistics")
+        return self._query("workout_statistics", {"workout_id": workout_id})
+
+    def aggregate_workout_statistics(
+        self, start_date: str, end_date: str
+    ) -> pd.DataFrame:
+        """
+        Totals and extremes of every statistic type and unit over the workouts in a date
+        range.
+        """
+        self._require_table("workout_statistics")
+        return self._query(
+            "workout_statistics_aggregate",
             {
                 "start_date": start_date,
                 "end_date": end_date,
                 "min_duration": self.config.min_duration,
             },
         )
-        with duckdb.connect(database=str(self.config.db_path)) as con:
-            return con.execute(query).df()
-
-    @cache
-    def get_workout_points(self, workout_id: str) -> pd.DataFrame:
-        query = self.sql_mgr.get_query("workout_points", {"workout_id": workout_id})
-        with duckdb.connect(database=str(self.config.db_path)) as con:
-            return con.execute(query).df()
 
 
 # ### Visualisation Adapters with Output Method Support
+# Track simplification tolerances the renderer snaps to, so maps at similar scales
+# share cached tracks
+SIMPLIFY_LEVELS_M = (2, 5, 10, 20, 50, 100, 200, 500)
+# Web Mercator ground resolution at the equator for zoom level 0
+METRES_PER_PIXEL_ZOOM_0 = 156_543.03
+
+
+def snap_tolerance_m(metres_per_pixel: float) -> float:
+    """The coarsest simplification level that stays within one pixel."""
+    fitting = [level for level in SIMPLIFY_LEVELS_M if level <= metres_per_pixel]
+    return float(fitting[-1] if fitting else SIMPLIFY_LEVELS_M[0])
+
+
+# "polyline" ships tracks as encoded polylines decoded in the browser; "json" as
+# one folium PolyLine (a JSON coordinate list) per track
+TRACK_ENCODINGS = ("polyline", "json")
+# Encoded polylines keep 10**-5 degrees (about a metre), as Google's format does
+POLYLINE_PRECISION = 5
+
+
+def encode_polyline(coords: np.ndarray, precision: int = POLYLINE_PRECISION) -> str:
+    """
+    Encode an ``(n, 2)`` latitude/longitude array in Google's encoded polyline format.
+
+    Coordinates are quantized to ``10**-precision`` degrees and delta-encoded, and each
+    zigzagged delta is written as 5-bit groups in printable ASCII, low group first. All
+    points are encoded at once with NumPy rather than one character at a time.
+    """
+    if not len(coords):
+        return ""
+    scaled = np.round(np.asarray(coords, dtype=np.float64) * 10**precision).astype(
+        np.int64
+    )
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = (deltas << 1) ^ (deltas >> 63)
+    # A 64-bit value needs at most 13 groups; more[:, k]: group k is followed by more
+    shifts = 5 * np.arange(13)
+    more = (values[:, None] >> shifts[1:]) > 0
+    groups = (values[:, None] >> shifts[:-1]) & 0x1F
+    used = np.c_[np.ones(len(values), dtype=bool), more[:, :-1]]
+    characters = (groups | (more * 0x20)) + 63
+    return characters[used].astype(np.uint8).tobytes().decode("ascii")
+
+
+class EncodedPolylines(MacroElement):
+    """
+    Tracks embedded once as encoded polylines and drawn as Leaflet polylines in the
+    browser, sharing one style. The page carries a few bytes per point instead of a JSON
+    pair of full-precision floats, and parses a short list of strings.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function() {
+                function decode(encoded) {
+                    var points = [], latitude = 0, longitude = 0, index = 0;
+                    while (index < encoded.length) {
+                        for (var axis = 0; axis < 2; axis++) {
+                            var result = 0, shift = 0, group;
+                            do {
+                                group = encoded.charCodeAt(index++) - 63;
+                                result += (group & 0x1f) * Math.pow(2, shift);
+                                shift += 5;
+                            } while (group >= 0x20);
+                            var delta = result % 2 ? -(result + 1) / 2 : result / 2;
+                            if (axis === 0) {
+                                latitude += delta;
+                            } else {
+                                longitude += delta;
+                            }
+                        }
+                        points.push([
+                            latitude / {{ this.scale }},
+                            longitude / {{ this.scale }},
+                        ]);
+                    }
+                    return points;
+                }
+                var style = {{ this.style|tojson }};
+                {{ this.tracks_json }}.forEach(function(track) {
+                    L.polyline(decode(track), style)
+                        .addTo({{ this._parent.get_name() }});
+                });
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        tracks: List[np.ndarray],
+        style: Dict[str, Any],
+        precision: int = POLYLINE_PRECISION,
+    ):
+        super().__init__()
+        self._name = "EncodedPolylines"
+        self.tracks = [
+            encode_polyline(coords, precision) for coords in tracks if len(coords)
+        ]
+        # branca renders the script as a template again, so a "{{" in an encoded track
+        # must not reach it; JSON's \u escape keeps the string the same for the browser
+        self.tracks_json = json.dumps(self.tracks).replace("{", "\\u007b")
+        self.style = style
+        self.scale = 10**precision
+
+
+# ### Tile Pyramid
+TILE_SIZE = 256
+# Web Mercator stops at the latitude where the projected world is square
+MAX_MERCATOR_LATITUDE = 85.05112878
+# Workouts whose points are read and rasterized together while building tiles
+TILE_BATCH_WORKOUTS = 500
+
+
+def mercator_pixels(coords: np.ndarray, zoom: int) -> np.ndarray:
+    """
+    Global Web Mercator pixel coordinates (x, y) at ``zoom`` of an ``(n, 2)`` lat/lon
+    array.
+    """
+    world = TILE_SIZE * 2**zoom
+    latitude = np.radians(
+        np.clip(coords[:, 0], -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE)
+    )
+    x = (coords[:, 1] + 180.0) / 360.0 * world
+    y = (1.0 - np.arcsinh(np.tan(latitude)) / np.pi) / 2.0 * world
+    return np.c_[x, y]
+
+
+def mercator_coords(pixels: np.ndarray, zoom: int) -> np.ndarray:
+    """
+    Latitude/longitude of ``(n, 2)`` global Web Mercator pixel coordinates at ``zoom``.
+    """
+    world = TILE_SIZE * 2**zoom
+    pixels = np.asarray(pixels, dtype=np.float64)
+    latitude = np.degrees(
+        np.arctan(np.sinh(np.pi * (1.0 - 2.0 * pixels[:, 1] / world)))
+    )
+    return np.c_[latitude, pixels[:, 0] / world * 360.0 - 180.0]
+
+
+def tile_bounds(summaries: pd.DataFrame, zoom: int, padding: int = 0) -> np.ndarray:
+    """
+    Inclusive tile ranges ``[x0, x1, y0, y1]`` at ``zoom`` covering each workout's
+    bounding box, widened by ``padding`` pixels.
+    """
+    north_west = mercator_pixels(
+        summaries[["max_latitude", "min_longitude"]].to_numpy(), zoom
+    )
+    south_east = mercator_pixels(
+        summaries[["min_latitude", "max_longitude"]].to_numpy(), zoom
+    )
+    bounds = np.c_[
+        north_west[:, 0] - padding,
+        south_east[:, 0] + padding,
+        north_west[:, 1] - padding,
+        south_east[:, 1] + padding,
+    ]
+    return np.clip(bounds // TILE_SIZE, 0, 2**zoom - 1).astype(np.int64)
+
+
+def rasterize_tracks(
+    coords: np.ndarray, track_starts: np.ndarray, zoom: int, line_width: int = 1
+) -> np.ndarray:
+    """
+    The pixels at ``zoom`` covered by tracks ``line_width`` pixels wide, as sorted
+    unique keys ``(x * 2**zoom + y) << 16 | pixel`` of tile (x, y) and pixel offset
+    within it.
+
+    ``coords`` holds the tracks back to back, each starting at an index in
+    ``track_starts``. Every segment is sampled at least once per pixel it crosses, all
+    at once with NumPy, and the samples are widened by a square brush in global pixel
+    space so lines continue across tile edges.
+    """
+    if not len(coords):
+        return np.empty(0, dtype=np.int64)
+    points = mercator_pixels(coords, zoom)
+    deltas = np.diff(points, axis=0)
+    steps = np.ceil(np.abs(deltas).max(axis=1)).astype(np.int64)
+    steps[np.asarray(track_starts)[1:] - 1] = 0  # no segment between consecutive tracks
+    segment = np.repeat(np.arange(len(steps)), steps)
+    offsets = np.cumsum(steps) - steps
+    fraction = (np.arange(steps.sum()) - offsets[segment]) / steps[segment]
+    samples = np.r_[points[segment] + deltas[segment] * fraction[:, None], points]
+
+    brush = np.arange(line_width) - (line_width - 1) // 2
+    brush = np.stack(np.meshgrid(brush, brush), axis=-1).reshape(-1, 2)
+    world = TILE_SIZE * 2**zoom
+    pixels = np.floor(samples).astype(np.int64)[:, None, :] + brush[None, :, :]
+    pixels = np.clip(pixels.reshape(-1, 2), 0, world - 1)
+    x, y = pixels[:, 0], pixels[:, 1]
+    tile = (x // TILE_SIZE) * 2**zoom + y // TILE_SIZE
+    return unique_keys((tile << 16) | (y % TILE_SIZE) * TILE_SIZE + x % TILE_SIZE)
+
+
+def unique_keys(keys: np.ndarray) -> np.ndarray:
+    """
+    Sorted unique values of an int64 array; sorting is far faster than np.unique's
+    hashing here.
+    """
+    keys = np.sort(keys)
+    return keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+
+
+def png_bytes(indices: np.ndarray, palette: np.ndarray) -> bytes:
+    """
+    Encode a ``(height, width)`` uint8 array of indices into an RGBA ``palette`` as an
+    indexed-colour PNG, with the standard library only. One byte per pixel keeps zlib's
+    work, the bulk of writing a tile, to a quarter of a full RGBA image.
+    """
+    height, width = indices.shape
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    # Every scanline starts with filter type 0 (none)
+    scanlines = np.c_[np.zeros((height, 1), dtype=np.uint8), indices]
+    palette = np.asarray(palette, dtype=np.uint8)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        + chunk(b"PLTE", palette[:, :3].tobytes())
+        + chunk(b"tRNS", palette[:, 3].tobytes())
+        + chunk(b"IDAT", zlib.compress(scanlines.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+class TilePyramid:
+    """
+    Every workout's track drawn into transparent PNG tiles,
+    ``{tile_dir}/{z}/{x}/{y}.png``, for overlaying a whole workout history on a map
+    (``MapRenderer.render_tiles``).
+
+    ``tiles.json`` records the bounding box and point count each workout was drawn with.
+    ``build`` compares it with workout_summary and redraws only the tiles covering the
+    bounding boxes of new, changed or removed workouts, from the workouts overlapping
+    them. Tracks are read at the simplification level of each zoom when the converter's
+    workout_points_simplified table exists. Styling comes from ``map_defaults``
+    (``tile_min_zoom``, ``tile_max_zoom``, ``tile_color``, ``tile_line_width``);
+    changing it redraws everything.
+    """
+
+    def __init__(self, analyser: HealthKitAnalyser, tile_dir: Optional[Path] = None):
+        self.analyser = analyser
+        self.tile_dir = Path(tile_dir or analyser.config.tile_dir)
+        options = analyser.config.map_defaults or {}
+        self.min_zoom = options.get("tile_min_zoom", 6)
+        self.max_zoom = options.get("tile_max_zoom", 15)
+        self.color = options.get("tile_color", "#3388ff")
+        self.line_width = options.get("tile_line_width", 2)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.tile_dir / "tiles.json"
+
+    def _style(self) -> Dict[str, Any]:
+        return {
+            "min_zoom": self.min_zoom,
+            "max_zoom": self.max_zoom,
+            "color": self.color,
+            "line_width": self.line_width,
+        }
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _tile_path(self, zoom: int, tile: int) -> Path:
+        x, y = divmod(int(tile), 2**zoom)
+        return self.tile_dir / str(zoom) / str(x) / f"{y}.png"
+
+    def _covered_tiles(self, summaries: pd.DataFrame, zoom: int) -> np.ndarray:
+        tiles = [
+            np.add.outer(np.arange(x0, x1 + 1) * 2**zoom, np.arange(y0, y1 + 1)).ravel()
+            for x0, x1, y0, y1 in tile_bounds(summaries, zoom, self.line_width)
+        ]
+        return (
+            unique_keys(np.concatenate(tiles)) if tiles else np.empty(0, dtype=np.int64)
+        )
+
+    def _read_tracks(
+        self, workout_ids: List[str], tolerance_m: Optional[float]
+    ) -> Dict[str, np.ndarray]:
+        # A bulk scan: read straight from the database, leaving the result caches alone
+        name, params = "workout_points", {}
+        if tolerance_m is not None:
+            name, params = "workout_points_simplified", {"tolerance_m": tolerance_m}
+        with self.analyser._cursor() as con:
+            con.register(
+                "requested_workouts", pd.DataFrame({"workout_id": workout_ids})
+            )
+            try:
+                columns = self.analyser.sql_mgr.execute(
+                    con, f"{name}_many", params
+                ).fetchnumpy()
+            finally:
+                con.unregister("requested_workouts")
+        # GPX points without a position come back masked (NULL) or NaN; either would
+        # reach rasterize_tracks as a bogus int64 step count
+        for column in ("latitude", "longitude"):
+            columns[column] = np.ma.filled(columns[column].astype(float), np.nan)
+        finite = np.isfinite(columns["latitude"]) & np.isfinite(columns["longitude"])
+        if finite.all():
+            return columns
+        return {column: values[finite] for column, values in columns.items()}
+
+    def build(self, force: bool = False) -> int:
+        """
+        Create or bring the tiles up to date with the database, returning how many were
+        written.
+        """
+        start_time = time.time()
+        self.analyser._require_table("workout_summary")
+        summaries = self.analyser.get_workout_summaries()
+        summaries = summaries.dropna(subset=["min_latitude", "min_longitude"])
+        bbox_columns = [
+            "min_latitude",
+            "min_longitude",
+            "max_latitude",
+            "max_longitude",
+            "point_count",
+        ]
+        current = {
+            str(row[0]): [float(value) for value in row[1:]]
+            for row in summaries[["workout_id", *bbox_columns]].itertuples(index=False)
+        }
+
+        manifest = self._load_manifest()
+        if force or manifest.get("style") != self._style():
+            shutil.rmtree(self.tile_dir, ignore_errors=True)
+            manifest = {}
+        drawn = manifest.get("workouts", {})
+        changed = [
+            wid
+            for wid in current.keys() | drawn.keys()
+            if current.get(wid) != drawn.get(wid)
+        ]
+        if not changed:
+            logger.info(f"Tiles in '{self.tile_dir}' are up to date.")
+            return 0
+        # Tiles to redraw: everything on a first build, else those under the old and new
+        # bounding boxes of changed workouts
+        rebuild_all = not drawn
+        changed_boxes = pd.DataFrame(
+            [
+                box
+                for wid in changed
+                for box in (drawn.get(wid), current.get(wid))
+                if box
+            ],
+            columns=bbox_columns,
+        )
+        simplified = "workout_points_simplified" in self.analyser.tables
+
+        written = 0
+        for zoom in range(self.min_zoom, self.max_zoom + 1):
+            workout_ids = summaries["workout_id"].to_numpy()
+            if not rebuild_all:
+                touched = self._covered_tiles(changed_boxes, zoom)
+                # Padded by the line width, which can reach past a bounding box
+                bounds = tile_bounds(summaries, zoom, self.line_width)
+                tx, ty = touched // 2**zoom, touched % 2**zoom
+                overlaps = (
+                    (bounds[:, [0]] <= tx)
+                    & (tx <= bounds[:, [1]])
+                    & (bounds[:, [2]] <= ty)
+                    & (ty <= bounds[:, [3]])
+                ).any(axis=1)
+                workout_ids = workout_ids[overlaps]
+            tolerance_m = None
+            if simplified:
+                # Half a pixel at the equator (less elsewhere), so tiles are as sharp as
+                # the unsimplified tracks and redrawn tiles match the ones kept
+                tolerance_m = snap_tolerance_m(METRES_PER_PIXEL_ZOOM_0 / 2**zoom / 2)
+
+            keys = []
+            for first in range(0, len(workout_ids), TILE_BATCH_WORKOUTS):
+                columns = self._read_tracks(
+                    list(workout_ids[first : first + TILE_BATCH_WORKOUTS]), tolerance_m
+                )
+                ids = columns["workout_id"]
+                track_starts = (
+                    np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+                    if len(ids)
+                    else ids
+                )
+                keys.append(
+                    rasterize_tracks(
+                        coords_array(columns), track_starts, zoom, self.line_width
+                    )
+                )
+            keys = (
+                unique_keys(np.concatenate(keys))
+                if keys
+                else np.empty(0, dtype=np.int64)
+            )
+            tiles, pixels = keys >> 16, keys & 0xFFFF
+            if not rebuild_all:
+                inside = np.isin(tiles, touched)
+                tiles, pixels = tiles[inside], pixels[inside]
+                # Touched tiles no track crosses any more
+                for tile in np.setdiff1d(touched, tiles):
+                    self._tile_path(zoom, tile).unlink(missing_ok=True)
+
+            # Transparent background, and the line colour
+            palette = [[0, 0, 0, 0], [*bytes.fromhex(self.color.lstrip("#")), 255]]
+            indices = np.zeros(TILE_SIZE * TILE_SIZE, dtype=np.uint8)
+            firsts = (
+                np.flatnonzero(np.r_[True, tiles[1:] != tiles[:-1]])
+                if len(tiles)
+                else []
+            )
+            for first, last in zip(
+                firsts, np.r_[firsts[1:], len(tiles)] if len(tiles) else []
+            ):
+                indices[:] = 0
+                indices[pixels[first:last]] = 1
+                path = self._tile_path(zoom, tiles[first])
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_bytes(
+                    png_bytes(indices.reshape(TILE_SIZE, TILE_SIZE), palette)
+                )
+                os.replace(tmp_path, path)
+                written += 1
+
+        self.tile_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"style": self._style(), "workouts": current}))
+        os.replace(tmp_path, self.manifest_path)
+        logger.info(
+            f"Wrote {written:,} tiles for {len(changed):,} changed workouts "
+            f"to '{self.tile_dir}' in {time.time() - start_time:.2f} seconds."
+        )
+        return written
+
+
+# ### Heatmap
+def density_png(grid: np.ndarray, colormap: str = "YlOrRd_09") -> bytes:
+    """
+    A PNG of a point-count grid: empty pixels transparent, the rest coloured by the log
+    of their count with one of branca's linear colormaps, so a few heavily walked
+    streets don't wash out everything walked once.
+    """
+    levels = np.zeros(grid.shape, dtype=np.uint8)
+    walked = grid > 0
+    if walked.any():
+        scaled = np.log1p(grid[walked]) / np.log1p(grid.max())
+        levels[walked] = 1 + np.round(scaled * 254).astype(np.uint8)
+    scale = getattr(branca.colormap.linear, colormap).scale(0, 1)
+    palette = [(0, 0, 0, 0)] + [
+        scale.rgba_bytes_tuple(value) for value in np.linspace(0, 1, 255)
+    ]
+    return png_bytes(levels, np.array(palette))
+
+
 class MapRenderer:
     def __init__(self, analyser: HealthKitAnalyser):
         self.analyser = analyser
         self.config = analyser.config.map_defaults
+        self.map_cache = MapCache(
+            analyser.config.cache_dir / "maps", analyser.config.map_cache_max_bytes
+        )
+
+    def _page(self, key: Dict[str, Any], build: Callable[[], folium.Map]) -> Path:
+        """
+        The cached page for a map, built and stored on a miss. The cache key adds the
+        map style and the data source fingerprint to ``key``.
+        """
+        key = {
+            **key,
+            "style": self.config,
+            "source": self.analyser._source_fingerprint(),
+        }
+        path = self.map_cache.get(key)
+        if path is None:
+            path = self.map_cache.put(key, build().get_root().render())
+        return path
 
     def _base_map(self) -> folium.Map:
         return folium.Map(
@@ -101,6 +1888,42 @@ class MapRenderer:
             tiles=self.config["tiles"],
         )
 
+    def _tolerance_m(self, summaries: Optional[pd.DataFrame]) -> Optional[float]:
+        """
+        The coarsest simplification level that stays under one pixel on this map, from
+        the tracks' extent (they are fitted to a ``map_pixels`` wide view) or, without
+        summaries, the configured zoom. None renders every point.
+        """
+        if not self.config.get("simplify", True):
+            return None
+        if "workout_points_simplified" not in self.analyser.tables:
+            return None
+        if summaries is not None and len(summaries):
+            latitude = (
+                summaries["min_latitude"].min() + summaries["max_latitude"].max()
+            ) / 2
+            extent_m = (
+                1000
+                * KM_PER_DEGREE_LATITUDE
+                * max(
+                    summaries["max_latitude"].max() - summaries["min_latitude"].min(),
+                    (
+                        summaries["max_longitude"].max()
+                        - summaries["min_longitude"].min()
+                    )
+                    * np.cos(np.radians(latitude)),
+                )
+            )
+            metres_per_pixel = extent_m / self.config.get("map_pixels", 1000)
+        else:
+            latitude = self.config["origin"][0]
+            metres_per_pixel = (
+                METRES_PER_PIXEL_ZOOM_0
+                * np.cos(np.radians(latitude))
+                / 2 ** self.config["zoom"]
+            )
+        return snap_tolerance_m(metres_per_pixel)
+
     def render(self, workout_ids: List[str], output_method="console"):
         """
         Render the map using the specified output method.
@@ -112,32 +1935,187 @@ class MapRenderer:
         Returns:
             Depends on the output method.
         """
-        m = self._base_map()
+        summaries = None
+        if "workout_summary" in self.analyser.tables and workout_ids:
+            summaries = self.analyser.get_workout_summaries(workout_ids)
+        tolerance_m = self._tolerance_m(summaries)
+
+        def build() -> folium.Map:
+            m = self._base_map()
+            if summaries is not None:
+                m.fit_bounds(
+                    [
+                        [
+                            summaries["min_latitude"].min(),
+                            summaries["min_longitude"].min(),
+                        ],
+                        [
+                            summaries["max_latitude"].max(),
+                            summaries["max_longitude"].max(),
+                        ],
+                    ]
+                )
+            tracks = self.analyser.get_workout_points_many(
+                workout_ids, format="coords", tolerance_m=tolerance_m
+            )
+            style = {
+                "color": self.config.get("line_color", "blue"),
+                "weight": self.config.get("line_width", 3),
+            }
+            encoding = self.config.get("track_encoding", "polyline")
+            if encoding == "polyline":
+                EncodedPolylines(list(tracks.values()), style).add_to(m)
+            elif encoding == "json":
+                for coords in tracks.values():
+                    folium.PolyLine(coords.tolist(), **style).add_to(m)
+            else:
+                raise ValueError(
+                    f"Unknown track_encoding '{encoding}', "
+                    f"expected one of {TRACK_ENCODINGS}"
+                )
+            logger.debug(
+                f"Rendering {sum(len(coords) for coords in tracks.values()):,} vertices"
+                + (
+                    f" simplified to {tolerance_m:g} m"
+                    if tolerance_m is not None
+                    else ""
+                )
+            )
+            return m
+
+        key = {
+            "map": "tracks",
+            "workout_ids": list(workout_ids),
+            "tolerance_m": tolerance_m,
+        }
+        return self._output(self._page(key, build), output_method)
+
+    def render_tiles(self, output_method="console", build: bool = True):
+        """
+        Render every workout as an overlay of TilePyramid tiles, bringing the tiles up
+        to date first unless ``build`` is False. The page only references the tiles, by
+        a path relative to the cached page, so it loads at once however many workouts
+        there are. Jupyter and Streamlit embed the page's HTML rather than opening the
+        file, so the tiles cannot be found there and only console output is supported.
+        """
+        if output_method != "console":
+            raise ValueError(
+                f"Tile maps reference tiles on disk and only support console output, "
+                f"not '{output_method}'"
+            )
+        pyramid = TilePyramid(self.analyser)
+        if build:
+            pyramid.build()
+
+        def build_map() -> folium.Map:
+            m = self._base_map()
+            tile_url = Path(
+                os.path.relpath(pyramid.tile_dir, self.map_cache.cache_dir.resolve())
+            ).as_posix()
+            folium.TileLayer(
+                tiles=tile_url + "/{z}/{x}/{y}.png",
+                attr="Workouts",
+                name="Workouts",
+                overlay=True,
+                min_zoom=pyramid.min_zoom,
+                max_native_zoom=pyramid.max_zoom,
+            ).add_to(m)
+            summaries = self.analyser.get_workout_summaries()
+            if len(summaries):
+                m.fit_bounds(
+                    [
+                        [
+                            summaries["min_latitude"].min(),
+                            summaries["min_longitude"].min(),
+                        ],
+                        [
+                            summaries["max_latitude"].max(),
+                            summaries["max_longitude"].max(),
+                        ],
+                    ]
+                )
+            return m
+
+        key = {"map": "tiles", "tile_dir": str(pyramid.tile_dir.resolve())}
+        return self._output(self._page(key, build_map), output_method)
+
+    def _fit_zoom(
+        self, min_latitude, min_longitude, max_latitude, max_longitude
+    ) -> int:
+        """The deepest zoom at which a box fits in a ``map_pixels`` wide view."""
+        corners = mercator_pixels(
+            np.array([[max_latitude, min_longitude], [min_latitude, max_longitude]]), 0
+        )
+        extent = max(float(np.abs(corners[1] - corners[0]).max()), 1e-9)
+        zoom = int(np.floor(np.log2(self.config.get("map_pixels", 1000) / extent)))
+        return min(max(zoom, 0), self.config.get("heatmap_max_zoom", 17))
+
+    def render_heatmap(
+        self,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        zoom: Optional[int] = None,
+        output_method="console",
+    ):
+        """
+        Render a density heatmap of all workout points as a single PNG image overlay.
+
+        Args:
+            bbox: (min_latitude, min_longitude, max_latitude, max_longitude) to cover;
+                defaults to the extent of every workout.
+            zoom: Web Mercator zoom whose pixels are the heatmap's bins; defaults to the
+                zoom at which ``bbox`` fits the map.
+            output_method (str): How to output the map: console, jupyter or streamlit.
+        """
+        if bbox is None:
+            summaries = self.analyser.get_workout_summaries()
+            bbox = (
+                summaries["min_latitude"].min(),
+                summaries["min_longitude"].min(),
+                summaries["max_latitude"].max(),
+                summaries["max_longitude"].max(),
+            )
+        if zoom is None:
+            zoom = self._fit_zoom(*bbox)
+        bbox = tuple(float(value) for value in bbox)
 
-        for wid in workout_ids:
-            df = self.analyser.get_workout_points(wid)
-            folium.PolyLine(
-                df[["latitude", "longitude"]].values.tolist(),
-                color=self.config.get("line_color", "blue"),
-                weight=self.config.get("line_width", 3),
+        def build() -> folium.Map:
+            grid, bounds = self.analyser.point_density(*bbox, zoom)
+            image = density_png(grid, self.config.get("heatmap_colormap", "YlOrRd_09"))
+            m = self._base_map()
+            folium.raster_layers.ImageOverlay(
+                image="data:image/png;base64,"
+                + base64.b64encode(image).decode("ascii"),
+                bounds=bounds,
+                opacity=self.config.get("heatmap_opacity", 0.8),
+                name="Heatmap",
             ).add_to(m)
+            m.fit_bounds([[bbox[0], bbox[1]], [bbox[2], bbox[3]]])
+            return m
+
+        key = {"map": "heatmap", "bbox": bbox, "zoom": zoom}
+        return self._output(self._page(key, build), output_method)
 
+    def _output(self, path: Path, output_method: str):
         # Output based on method
         if output_method == "console":
-            logger.info("Map generated. Use a browser to view it.")
-            map_path = Path("output_map.html")
-            m.save(str(map_path))
-            logger.info(f"Map saved to {map_path}")
+            logger.info(f"Map saved to {path}. Use a browser to view it.")
+            return path
 
         elif output_method == "jupyter":
-            from IPython.display import display
+            from IPython.display import HTML, display
 
-            display(m)
+            page = html.escape(path.read_text(encoding="utf-8"))
+            display(
+                HTML(
+                    f'<iframe srcdoc="{page}" '
+                    'style="width: 100%; height: 500px; border: none"></iframe>'
+                )
+            )
 
         elif output_method == "streamlit":
             import streamlit as st
 
-            st.components.v1.html(m._repr_html_(), height=500)
+            st.components.v1.html(path.read_text(encoding="utf-8"), height=500)
 
         elif output_method == "marimo":
             # Example Marimo integration (hypothetical)
@@ -149,7 +2127,7 @@ class MapRenderer:
 
 # ### Example Usage Patterns
 if __name__ == "__main__":
-    analyser = HealthKitAnalyser()
+    analyser = HealthKitAnalyser()  # or `with HealthKitAnalyser() as analyser:`
 
     # Example workout IDs (replace with actual IDs from your database)
     workouts_df = analyser.get_workouts("2025-03-11", "2025-03-15")
@@ -160,6 +2138,11 @@ if __name__ == "__main__":
     # Console Example (saves the map to an HTML file)
     renderer.render(workout_ids, output_method="console")
 
+    # Whole-history Example (draws every workout into tiles/, then overlays them)
+    """
+    renderer.render_tiles(output_method="console")
+    """
+
     # Jupyter Example (displays the map in a notebook)
     """
     renderer.render(workout_ids, output_method="jupyter")
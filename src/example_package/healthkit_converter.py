@@ -1,28 +1,784 @@
 import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
 import subprocess
 import sys
 import time
-import sqlite3
-import pandas as pd
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
 from loguru import logger
 import tomllib
 import duckdb
-from typing import List, Dict
+import numpy as np
+import pandas as pd
+from typing import IO, Callable, Deque, Iterator, List, Dict, Optional, Tuple
+
+ENGINES = ("native", "sqlite")
+
+GPX_NAMESPACE = "{http://www.topografix.com/GPX/1/1}"
+
+# Columns written by the native engine. They follow the healthkit-to-sqlite
+# layout, except that MetadataEntry children are kept in one JSON column
+# instead of being spread over metadata_* columns, and that ids are hashes of
+# WORKOUT_NATURAL_KEY (see "Converter output" in the README).
+WORKOUT_COLUMNS = [
+    "id",
+    "workoutActivityType",
+    "duration",
+    "durationUnit",
+    "totalDistance",
+    "totalDistanceUnit",
+    "totalEnergyBurned",
+    "totalEnergyBurnedUnit",
+    "sourceName",
+    "sourceVersion",
+    "device",
+    "creationDate",
+    "startDate",
+    "endDate",
+    "metadata",
+    "workout_events",
+    "workout_statistics",
+    "content_hash",
+]
+
+WORKOUT_POINT_COLUMNS = [
+    "date",
+    "latitude",
+    "longitude",
+    "altitude",
+    "horizontalAccuracy",
+    "verticalAccuracy",
+    "course",
+    "speed",
+    "workout_id",
+]
+
+NATIVE_TABLES_DDL = """
+    CREATE OR REPLACE TABLE workouts (
+        id VARCHAR,
+        workoutActivityType VARCHAR,
+        duration DOUBLE,
+        durationUnit VARCHAR,
+        totalDistance DOUBLE,
+        totalDistanceUnit VARCHAR,
+        totalEnergyBurned DOUBLE,
+        totalEnergyBurnedUnit VARCHAR,
+        sourceName VARCHAR,
+        sourceVersion VARCHAR,
+        device VARCHAR,
+        creationDate TIMESTAMPTZ,
+        startDate TIMESTAMPTZ,
+        endDate TIMESTAMPTZ,
+        metadata VARCHAR,
+        workout_events VARCHAR,
+        workout_statistics VARCHAR,
+        content_hash VARCHAR,
+        workout_uuid UUID DEFAULT uuid()
+    );
+    CREATE OR REPLACE TABLE workout_points (
+        date TIMESTAMPTZ,
+        latitude DOUBLE,
+        longitude DOUBLE,
+        altitude DOUBLE,
+        horizontalAccuracy DOUBLE,
+        verticalAccuracy DOUBLE,
+        course DOUBLE,
+        speed DOUBLE,
+        workout_id VARCHAR
+    );
+"""
+
+INGEST_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        source VARCHAR,
+        engine VARCHAR,
+        mode VARCHAR,
+        workouts_ingested BIGINT,
+        workouts_replaced BIGINT,
+        workouts_skipped BIGINT,
+        points_ingested BIGINT,
+        watermark VARCHAR,
+        ingested_at TIMESTAMP DEFAULT current_timestamp
+    );
+"""
+
+# Parquet datasets are Hive-partitioned by the UTC calendar month in which the
+# workout started
+PARTITION_DATE_SQL = "CAST(timezone('UTC', w.startDate) AS DATE)"
+PARQUET_ROW_GROUP_SIZE = 122_880
+
+# Explicit column types applied at ingest, so dates compare as timestamps and
+# DuckDB can use zone maps and filter pushdown instead of parsing strings per row
+WORKOUT_TYPES = {
+    "duration": "DOUBLE",
+    "totalDistance": "DOUBLE",
+    "totalEnergyBurned": "DOUBLE",
+    "creationDate": "TIMESTAMPTZ",
+    "startDate": "TIMESTAMPTZ",
+    "endDate": "TIMESTAMPTZ",
+}
+
+WORKOUT_POINT_TYPES = {
+    "date": "TIMESTAMPTZ",
+    "latitude": "DOUBLE",
+    "longitude": "DOUBLE",
+    "altitude": "DOUBLE",
+    "horizontalAccuracy": "DOUBLE",
+    "verticalAccuracy": "DOUBLE",
+    "course": "DOUBLE",
+    "speed": "DOUBLE",
+}
+
+# Low-cardinality workouts columns stored as ENUM types, rebuilt after every ingest
+WORKOUT_ENUMS = {
+    "sourceName": "source_name",
+    "workoutActivityType": "workout_activity_type",
+}
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_sql(lat1: str, lon1: str, lat2: str, lon2: str) -> str:
+    """
+    SQL expression for the great-circle distance in km between two points in degrees.
+    """
+    return f"""
+    2 * {EARTH_RADIUS_KM} * asin(sqrt(
+        pow(sin(radians({lat2} - {lat1}) / 2), 2)
+        + cos(radians({lat1})) * cos(radians({lat2}))
+        * pow(sin(radians({lon2} - {lon1}) / 2), 2)
+    ))
+"""
+
+
+# Great-circle distance in km between the current and previous point of a track
+SEGMENT_KM_SQL = haversine_sql(
+    "prev_latitude", "prev_longitude", "latitude", "longitude"
+)
+# Segments slower than this count as stopped when summing moving time
+MOVING_SPEED_MPS = 0.5
+
+# Side, in degrees, of the square cells of the workout_grid spatial index (~1 km of
+# latitude)
+GRID_CELL_DEG = 0.01
+
+# A workout continues another when it starts within this distance of the other's end
+# and at most this long after it (overnight stops and rest days on multi-day walks)
+CONTINUATION_MAX_KM = 2.0
+CONTINUATION_MAX_GAP_HOURS = 48
+
+# Points whose Douglas-Peucker significance is below this many metres are left out of
+# workout_points_simplified; renderers pick any coarser tolerance from what remains
+SIMPLIFY_MIN_TOLERANCE_M = 2.0
+METRES_PER_DEGREE = 111_195.0
+
+# JSON shape of the workout_statistics column: a list of WorkoutStatistics attributes
+WORKOUT_STATISTICS_JSON_TYPE = (
+    '[{"type": "VARCHAR", "startDate": "VARCHAR", "endDate": "VARCHAR", '
+    '"sum": "VARCHAR", "average": "VARCHAR", "minimum": "VARCHAR", '
+    '"maximum": "VARCHAR", "unit": "VARCHAR"}]'
+)
+
+# Natural key used to spot an existing workout that a newer export has changed
+WORKOUT_NATURAL_KEY = ("sourceName", "workoutActivityType", "startDate")
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value not in (None, "") else None
+
+
+def healthkit_timestamp_sql(column: str) -> str:
+    """
+    SQL parsing HealthKit ('2023-10-01 08:00:00 +1000') and GPX ('2023-09-30T22:00:00Z')
+    timestamps.
+    """
+    return (
+        f"strptime(regexp_replace(replace({column}, 'T', ' '), 'Z$', ' +0000'), "
+        "['%Y-%m-%d %H:%M:%S %z', '%Y-%m-%d %H:%M:%S.%f %z'])"
+    )
+
+
+def typed_select_sql(columns: List[str], types: Dict[str, str]) -> str:
+    """
+    A ``*`` projection that casts each column listed in ``types`` to its ingest type.
+    """
+    replacements = []
+    for name in columns:
+        dtype = types.get(name)
+        if dtype == "TIMESTAMPTZ":
+            expr = healthkit_timestamp_sql(f'"{name}"')
+        elif dtype:
+            expr = f'CAST("{name}" AS {dtype})'
+        else:
+            continue
+        replacements.append(f'{expr} AS "{name}"')
+    return f"* REPLACE ({', '.join(replacements)})" if replacements else "*"
+
+
+def workout_id(attrib: Dict[str, str]) -> str:
+    """
+    Stable workout id: a SHA-1 of the attributes that identify a workout across exports.
+    """
+    key = {k: attrib.get(k) for k in WORKOUT_NATURAL_KEY}
+    return hashlib.sha1(
+        json.dumps(key, separators=(",", ":"), sort_keys=True).encode("utf8")
+    ).hexdigest()
+
+
+def find_export_xml(zf: zipfile.ZipFile) -> str:
+    """
+    Return the name of the export.xml member (not export_cda.xml) inside an export ZIP.
+    """
+    for name in zf.namelist():
+        if name.lower().rsplit("/", 1)[-1] == "export.xml":
+            return name
+    raise FileNotFoundError("No export.xml found in the HealthKit export ZIP.")
+
+
+def iter_top_level_elements(fp: IO[bytes], tag: str) -> Iterator[ET.Element]:
+    """
+    Incrementally parse export.xml and yield each top-level element with the given tag.
+
+    Every top-level element (Record, Workout, ActivitySummary, ...) is cleared from the
+    tree once it has been handled, so memory stays flat regardless of the export size.
+    """
+    root = None
+    depth = 0
+    for event, el in ET.iterparse(fp, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = el
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            if el.tag == tag:
+                yield el
+            root.clear()
+
+
+def parse_workout(el: ET.Element) -> Tuple[Tuple, List[Tuple], List[str]]:
+    """
+    Split a Workout element into a workouts row, its embedded route points and its GPX
+    file references.
+
+    The row ends with a content hash of every field, which incremental runs use to tell
+    an unchanged workout from one that a newer export has modified.
+    """
+    attrib = el.attrib
+    wid = workout_id(attrib)
+    metadata, events, statistics, points, route_paths = {}, [], [], [], []
+    for child in el:
+        if child.tag == "MetadataEntry":
+            metadata[child.get("key")] = child.get("value")
+        elif child.tag == "WorkoutEvent":
+            events.append(dict(child.attrib))
+        elif child.tag == "WorkoutStatistics":
+            statistics.append(dict(child.attrib))
+        elif child.tag == "WorkoutRoute":
+            for route_child in child:
+                if route_child.tag == "FileReference":
+                    route_paths.append(route_child.get("path"))
+                elif route_child.tag == "Location":
+                    loc = route_child.attrib
+                    points.append(
+                        (
+                            loc.get("date"),
+                            _to_float(loc.get("latitude")),
+                            _to_float(loc.get("longitude")),
+                            _to_float(loc.get("altitude")),
+                            _to_float(loc.get("horizontalAccuracy")),
+                            _to_float(loc.get("verticalAccuracy")),
+                            _to_float(loc.get("course")),
+                            _to_float(loc.get("speed")),
+                            wid,
+                        )
+                    )
+    fields = (
+        attrib.get("workoutActivityType"),
+        _to_float(attrib.get("duration")),
+        attrib.get("durationUnit"),
+        _to_float(attrib.get("totalDistance")),
+        attrib.get("totalDistanceUnit"),
+        _to_float(attrib.get("totalEnergyBurned")),
+        attrib.get("totalEnergyBurnedUnit"),
+        attrib.get("sourceName"),
+        attrib.get("sourceVersion"),
+        attrib.get("device"),
+        attrib.get("creationDate"),
+        attrib.get("startDate"),
+        attrib.get("endDate"),
+        json.dumps(metadata),
+        json.dumps(events),
+        json.dumps(statistics),
+    )
+    content_hash = hashlib.sha1(
+        json.dumps([fields, metadata], separators=(",", ":")).encode("utf8")
+    ).hexdigest()
+    return (wid, *fields, content_hash), points, route_paths
+
+
+GPX_POINT_FIELDS = {
+    "latitude": "lat",
+    "longitude": "lon",
+    "altitude": "ele",
+    "horizontalAccuracy": "hAcc",
+    "verticalAccuracy": "vAcc",
+    "course": "course",
+    "speed": "speed",
+}
+
+
+def parse_gpx_points(fp: IO[bytes]) -> Dict[str, np.ndarray]:
+    """
+    Parse the track points of a workout-routes/*.gpx file into workout_points column
+    arrays.
+    """
+    dates = []
+    values = {column: [] for column in GPX_POINT_FIELDS}
+    for _, el in ET.iterparse(fp):
+        if el.tag != f"{GPX_NAMESPACE}trkpt":
+            continue
+        point = dict(el.attrib)
+        for child in el.iter():
+            point[child.tag.rpartition("}")[2]] = child.text
+        dates.append(point.get("time"))
+        for column, field in GPX_POINT_FIELDS.items():
+            values[column].append(point.get(field))
+        el.clear()
+
+    columns = {"date": np.array(dates, dtype=object)}
+    for column, raw in values.items():
+        columns[column] = np.array(
+            [float(v) if v not in (None, "") else np.nan for v in raw], dtype=np.float64
+        )
+    return columns
+
+
+# Each route worker process opens the export ZIP once and keeps it open
+_route_zip: Optional[zipfile.ZipFile] = None
+
+
+def _init_route_worker(zip_filepath: str):
+    global _route_zip
+    _route_zip = zipfile.ZipFile(zip_filepath)
+
+
+def parse_gpx_route(member: str, wid: str) -> Dict[str, np.ndarray]:
+    """Parse one route file from the ZIP opened by _init_route_worker."""
+    with _route_zip.open(member) as fp:
+        columns = parse_gpx_points(fp)
+    columns["workout_id"] = np.full(len(columns["date"]), wid, dtype=object)
+    return columns
+
+
+class RouteParser:
+    """
+    Parse workout-routes GPX files across a pool of worker processes.
+
+    Results come back in submission order, so the single writer appends points
+    deterministically, and at most ``max_pending`` parsed routes are held at once.
+    With one worker the routes are parsed in-process.
+    """
+
+    def __init__(
+        self, zip_filepath: Path, workers: int, max_pending: Optional[int] = None
+    ):
+        self.zip_filepath = zip_filepath
+        self.workers = workers
+        self.max_pending = max_pending or 4 * workers
+        self.pending: Deque[Future] = deque()
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "RouteParser":
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_route_worker,
+                initargs=(str(self.zip_filepath),),
+            )
+        else:
+            _init_route_worker(str(self.zip_filepath))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _route_zip
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=exc_type is not None)
+        elif _route_zip is not None:
+            _route_zip.close()
+            _route_zip = None
+        self.pending.clear()
+
+    def submit(self, member: str, wid: str) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Queue a route and yield the oldest parsed routes once too many are pending.
+        """
+        if self.pool is None:
+            future = Future()
+            future.set_result(parse_gpx_route(member, wid))
+        else:
+            future = self.pool.submit(parse_gpx_route, member, wid)
+        self.pending.append(future)
+        while len(self.pending) > self.max_pending:
+            yield self.pending.popleft().result()
+
+    def drain(self) -> Iterator[Dict[str, np.ndarray]]:
+        while self.pending:
+            yield self.pending.popleft().result()
+
+
+class BatchWriter:
+    """
+    Buffer rows or column batches for one DuckDB table and append them in bounded
+    batches.
+    """
+
+    def __init__(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        table: str,
+        columns: List[str],
+        batch_size: int,
+        types: Optional[Dict[str, str]] = None,
+    ):
+        self.con = con
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.select_sql = typed_select_sql(columns, types or {})
+        self.rows: List[Tuple] = []
+        self.frames: List[pd.DataFrame] = []
+        self.buffered = 0
+        self.row_count = 0
+
+    def extend(self, rows: List[Tuple]):
+        self.rows.extend(rows)
+        self._buffer(len(rows))
+
+    def extend_columns(self, columns: Dict[str, np.ndarray]):
+        frame = pd.DataFrame(columns, columns=self.columns)
+        if len(frame):
+            self.frames.append(frame)
+            self._buffer(len(frame))
+
+    def _buffer(self, n_rows: int):
+        self.buffered += n_rows
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.frames.append(
+                pd.DataFrame.from_records(self.rows, columns=self.columns)
+            )
+        if not self.frames:
+            return
+        batch = (
+            pd.concat(self.frames, ignore_index=True)
+            if len(self.frames) > 1
+            else self.frames[0]
+        )
+        self.con.register("_batch", batch)
+        self.con.execute(
+            f'INSERT INTO "{self.table}" BY NAME SELECT {self.select_sql} FROM _batch'
+        )
+        self.con.unregister("_batch")
+        self.row_count += len(batch)
+        self.rows, self.frames, self.buffered = [], [], 0
+
+
+# Share of the memory budget handed to DuckDB; the rest covers the Python-side
+# batches and the GPX worker processes. DuckDB spills to temp_directory rather than
+# exceed its share.
+DUCKDB_MEMORY_FRACTION = 0.5
+# Rough in-memory cost of one buffered row, counting the pandas copy made on flush
+BATCH_ROW_BYTES = 1_000
+# Rough proportional set size of one GPX worker process: its share of the interpreter
+# and modules inherited on fork, plus the route being parsed and the parsed routes
+# queued for it. Measured at ~40 MiB with 10,000-point routes and ~100 MiB with
+# 100,000-point ones (benchmarks/bench_convert_memory.py).
+ROUTE_WORKER_BYTES = 64 * 2**20
+
+SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "kb": 10**3,
+    "mb": 10**6,
+    "gb": 10**9,
+    "tb": 10**12,
+    "kib": 2**10,
+    "mib": 2**20,
+    "gib": 2**30,
+    "tib": 2**40,
+}
+
+
+def parse_size(size: str) -> int:
+    """Parse a DuckDB-style size such as '2GB' or '512MiB' into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*", str(size))
+    if not match or match.group(2).lower() not in SIZE_UNITS:
+        raise ValueError(
+            f"Invalid memory size '{size}', expected e.g. '2GB' or '512MiB'"
+        )
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def peak_rss_bytes() -> Optional[Dict[str, int]]:
+    """
+    Peak resident set size of this process and of its largest child, if the platform
+    reports it.
+    """
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks so large exports are not loaded into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while chunk := fp.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: Path) -> Dict[str, int]:
+    """Cheap identity of a file we wrote ourselves: size and modification time."""
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def atomic_write_text(path: Path, text: str):
+    """Write a text file via a sibling temporary file and an atomic rename."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def douglas_peucker_significance(
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    track_starts: np.ndarray,
+    min_tolerance_m: float = SIMPLIFY_MIN_TOLERANCE_M,
+) -> np.ndarray:
+    """
+    Douglas-Peucker significance, in metres, of every point of one or more tracks.
+
+    A track simplified with tolerance ``t`` keeps exactly the points whose significance
+    is at least ``t``, so one pass serves every tolerance. ``track_starts`` holds the
+    index of each track's first point (tracks are consecutive and time-ordered); track
+    endpoints get ``inf``. Instead of recursing per segment, every open segment of every
+    track is split at once per iteration with NumPy, so the Python loop runs once per
+    recursion level. Segments whose furthest point is closer than ``min_tolerance_m``
+    stop splitting, and their interior points get significance 0.
+    """
+    n = len(latitude)
+    significance = np.zeros(n)
+    if n == 0:
+        return significance
+    # Local equirectangular projection in metres; fine at the scale of one segment
+    y = np.asarray(latitude, dtype=np.float64) * METRES_PER_DEGREE
+    x = (
+        np.asarray(longitude, dtype=np.float64)
+        * METRES_PER_DEGREE
+        * np.cos(np.radians(latitude))
+    )
+    starts = np.asarray(track_starts, dtype=np.int64)
+    ends = np.r_[starts[1:], n] - 1
+    significance[starts] = np.inf
+    significance[ends] = np.inf
+
+    first, last, cap = starts, ends, np.full(len(starts), np.inf)
+    while True:
+        open_ = last - first >= 2
+        first, last, cap = first[open_], last[open_], cap[open_]
+        if not len(first):
+            break
+        interior = last - first - 1
+        segment = np.repeat(np.arange(len(first)), interior)
+        offsets = np.cumsum(interior) - interior
+        idx = first[segment] + 1 + np.arange(interior.sum()) - offsets[segment]
+
+        # Distance from each interior point to its segment's chord
+        ax, ay = x[first][segment], y[first][segment]
+        dx, dy = x[last][segment] - ax, y[last][segment] - ay
+        length2 = dx * dx + dy * dy
+        t = np.clip(
+            np.divide(
+                (x[idx] - ax) * dx + (y[idx] - ay) * dy,
+                length2,
+                out=np.zeros_like(dx),
+                where=length2 > 0,
+            ),
+            0.0,
+            1.0,
+        )
+        distance = np.hypot(x[idx] - (ax + t * dx), y[idx] - (ay + t * dy))
+
+        furthest = np.maximum.reduceat(distance, offsets)
+        is_max = distance == furthest[segment]
+        _, first_max = np.unique(segment[is_max], return_index=True)
+        split = idx[np.flatnonzero(is_max)[first_max]]
+
+        keep = furthest >= min_tolerance_m
+        split, furthest = split[keep], furthest[keep]
+        first, last, cap = first[keep], last[keep], cap[keep]
+        # A point survives tolerance t only if every split above it did too
+        significance[split] = np.minimum(furthest, cap)
+        first, last, cap = (
+            np.r_[first, split],
+            np.r_[split, last],
+            np.r_[significance[split], significance[split]],
+        )
+    return significance
+
+
+class ConversionManifest:
+    """
+    JSON record of the pipeline stages completed for one conversion.
+
+    ``key`` identifies the conversion (input checksums and options). Progress recorded
+    under a different key is discarded on load, so a changed export or option always
+    starts from scratch.
+    """
+
+    def __init__(self, path: Path, key: Dict):
+        self.path = path
+        self.key = key
+        self.completed: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, path: Path, key: Dict) -> "ConversionManifest":
+        manifest = cls(path, key)
+        if path.exists():
+            try:
+                data = json.loads(path.read_text())
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable manifest '{path}'.")
+                return manifest
+            if data.get("key") == key:
+                manifest.completed = data.get("completed", {})
+        return manifest
+
+    def mark(self, stage: str, **info):
+        self.completed[stage] = {"completed_at": time.time(), **info}
+        self.save()
+
+    def reset(self, keep: Tuple[str, ...] = ()):
+        self.completed = {k: v for k, v in self.completed.items() if k in keep}
+        self.save()
+
+    def save(self):
+        atomic_write_text(
+            self.path,
+            json.dumps({"key": self.key, "completed": self.completed}, indent=2),
+        )
 
 
 class HealthKitConverter:
     def __init__(
         self,
         zip_filepath: Path,
-        sqlite_filepath: Path,
+        sqlite_filepath: Optional[Path],
         duckdb_filepath: Path,
         tables_to_keep: List[str],
+        engine: str = "native",
+        batch_size: int = 50_000,
+        workers: int = 1,
+        parquet_dirpath: Optional[Path] = None,
+        memory_limit: Optional[str] = None,
+        threads: Optional[int] = None,
+        temp_dirpath: Optional[Path] = None,
     ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
         self.zip_filepath = zip_filepath
         self.sqlite_filepath = sqlite_filepath
         self.duckdb_filepath = duckdb_filepath
         self.tables_to_keep = tables_to_keep
+        self.engine = engine
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.parquet_dirpath = parquet_dirpath
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self.temp_dirpath = temp_dirpath
+        self._working_filepath: Optional[Path] = None
+
+        self.duckdb_config: Dict[str, object] = {}
+        if memory_limit is not None:
+            budget = parse_size(memory_limit)
+            self.duckdb_config["memory_limit"] = (
+                f"{int(budget * DUCKDB_MEMORY_FRACTION)}B"
+            )
+            python_budget = int(budget * (1 - DUCKDB_MEMORY_FRACTION))
+            # GPX workers get at most half of the Python-side share; a single worker
+            # parses in-process and costs nothing extra
+            max_workers = max(1, python_budget // 2 // ROUTE_WORKER_BYTES)
+            if self.workers > max_workers:
+                logger.info(
+                    f"Lowering workers from {self.workers} to {max_workers} "
+                    f"to fit the {memory_limit} memory budget."
+                )
+                self.workers = max_workers
+            worker_bytes = ROUTE_WORKER_BYTES * self.workers if self.workers > 1 else 0
+            max_batch_rows = max(
+                1_000, (python_budget - worker_bytes) // BATCH_ROW_BYTES
+            )
+            if self.batch_size > max_batch_rows:
+                logger.info(
+                    f"Lowering batch_size from {self.batch_size:,} "
+                    f"to {max_batch_rows:,} rows to fit the {memory_limit} "
+                    "memory budget."
+                )
+                self.batch_size = max_batch_rows
+        if threads is not None:
+            self.duckdb_config["threads"] = threads
+        if temp_dirpath is not None:
+            self.duckdb_config["temp_directory"] = str(temp_dirpath)
+
+    @property
+    def working_filepath(self) -> Path:
+        """
+        The DuckDB file stages write to: the partial build during ``run``, else the
+        output.
+        """
+        return self._working_filepath or self.duckdb_filepath
+
+    def _connect(self, read_only: bool = False) -> duckdb.DuckDBPyConnection:
+        """
+        Open the working database with the configured memory limit, threads and spill
+        directory.
+        """
+        return duckdb.connect(
+            str(self.working_filepath), read_only=read_only, config=self.duckdb_config
+        )
+
+    @property
+    def partial_filepath(self) -> Path:
+        return self.duckdb_filepath.with_name(self.duckdb_filepath.name + ".partial")
+
+    @property
+    def manifest_filepath(self) -> Path:
+        return self.duckdb_filepath.with_name(
+            self.duckdb_filepath.name + ".manifest.json"
+        )
 
     @classmethod
     def from_toml(cls, toml_path: Path) -> "HealthKitConverter":
@@ -33,11 +789,21 @@ class HealthKitConverter:
         with open(toml_path, "rb") as f:
             config = tomllib.load(f)
 
+        sqlite_filepath = config["paths"].get("sqlite_filepath")
+        parquet_dirpath = config["paths"].get("parquet_dirpath")
+        temp_dirpath = config["paths"].get("temp_dirpath")
         return cls(
             zip_filepath=Path(config["paths"]["zip_filepath"]),
-            sqlite_filepath=Path(config["paths"]["sqlite_filepath"]),
+            sqlite_filepath=Path(sqlite_filepath) if sqlite_filepath else None,
             duckdb_filepath=Path(config["paths"]["duckdb_filepath"]),
             tables_to_keep=config["parameters"]["tables_to_keep"],
+            engine=config["parameters"].get("engine", "native"),
+            batch_size=config["parameters"].get("batch_size", 50_000),
+            workers=config["parameters"].get("workers", 1),
+            parquet_dirpath=Path(parquet_dirpath) if parquet_dirpath else None,
+            memory_limit=config["parameters"].get("memory_limit"),
+            threads=config["parameters"].get("threads"),
+            temp_dirpath=Path(temp_dirpath) if temp_dirpath else None,
         )
 
     def convert_zip_to_sqlite(self, force: bool = False):
@@ -47,6 +813,9 @@ class HealthKitConverter:
             logger.error(f"The zip file '{self.zip_filepath}' does not exist.")
             sys.exit(1)
 
+        if self.sqlite_filepath is None:
+            raise ValueError("The 'sqlite' engine needs a SQLite filepath.")
+
         # Check if the SQLite file exists
         if self.sqlite_filepath.exists():
             if not force:
@@ -59,78 +828,1164 @@ class HealthKitConverter:
                     f"Overwriting existing SQLite file '{self.sqlite_filepath}'."
                 )
 
-        # Run the healthkit-to-sqlite command
-        command = f"healthkit-to-sqlite {self.zip_filepath} {self.sqlite_filepath}"
-        logger.info(f"Running command: {command}")
-        subprocess.run(command, shell=True)
+        # Run the healthkit-to-sqlite command into a temporary file, so an interrupted
+        # run never leaves a truncated database behind under the real name
+        tmp_filepath = self.sqlite_filepath.with_name(
+            self.sqlite_filepath.name + ".partial"
+        )
+        tmp_filepath.unlink(missing_ok=True)
+        command = ["healthkit-to-sqlite", str(self.zip_filepath), str(tmp_filepath)]
+        logger.info(f"Running command: {' '.join(command)}")
+        subprocess.run(command, check=True)
+        os.replace(tmp_filepath, self.sqlite_filepath)
 
-    def convert_sqlite_to_duckdb(self):
-        """Convert SQLite database to DuckDB with transformations using DuckDB for CSV export."""
-        logger.info("Starting conversion from SQLite to DuckDB...")
+    def convert_zip_to_duckdb(self, incremental: bool = False):
+        """
+        Stream export.xml and the workout-routes GPX files straight from the ZIP into
+        DuckDB.
 
-        con = duckdb.connect(str(self.duckdb_filepath))
-        con.execute("INSTALL sqlite;")
-        con.execute("LOAD sqlite;")
+        With ``incremental`` the existing tables are kept: workouts whose content hash
+        is unchanged are skipped without opening their route file, and new or changed
+        workouts are staged and then upserted together with their points.
+        """
+        if not self.zip_filepath.exists():
+            logger.error(f"The zip file '{self.zip_filepath}' does not exist.")
+            sys.exit(1)
 
-        sqlite_con = sqlite3.connect(self.sqlite_filepath)
+        unsupported = set(self.tables_to_keep) - {"workouts", "workout_points"}
+        if unsupported:
+            logger.warning(
+                "The native engine only writes 'workouts' and 'workout_points'; "
+                f"ignoring {sorted(unsupported)}."
+            )
 
+        logger.info(f"Starting native conversion of '{self.zip_filepath}' to DuckDB...")
+        start_time = time.time()
+
+        con = self._connect()
         try:
-            # Export tables to CSV
-            for table in self.tables_to_keep:
-                start_time = time.time()
-                csv_file = f"{table}.csv"
-                logger.info(f"Exporting table '{table}' to '{csv_file}'...")
+            incremental = incremental and self._has_tables(con)
+            if incremental and "content_hash" not in {
+                row[0] for row in con.execute("DESCRIBE workouts").fetchall()
+            }:
+                logger.warning(
+                    "Existing workouts were not written by the native engine; "
+                    "running a full ingest instead."
+                )
+                incremental = False
+            if incremental:
+                known = dict(
+                    con.execute("SELECT id, content_hash FROM workouts").fetchall()
+                )
+                con.execute(
+                    "CREATE TEMP TABLE _stage_workouts AS "
+                    f"SELECT {self._enums_as_varchar_sql()} FROM workouts LIMIT 0"
+                )
+                # CTAS copies the columns but not their defaults, and staged rows are
+                # written without a workout_uuid
+                con.execute(
+                    "ALTER TABLE _stage_workouts ALTER workout_uuid SET DEFAULT uuid()"
+                )
+                con.execute(
+                    "CREATE TEMP TABLE _stage_workout_points AS "
+                    "SELECT * FROM workout_points LIMIT 0"
+                )
+                targets = ("_stage_workouts", "_stage_workout_points")
+            else:
+                known = {}
+                con.execute(NATIVE_TABLES_DDL)
+                targets = ("workouts", "workout_points")
 
-                # Read table from SQLite into a Pandas DataFrame
-                query = f'SELECT * FROM "{table}"'
-                df = pd.read_sql_query(query, sqlite_con)
+            workouts = BatchWriter(
+                con, targets[0], WORKOUT_COLUMNS, self.batch_size, WORKOUT_TYPES
+            )
+            points = BatchWriter(
+                con,
+                targets[1],
+                WORKOUT_POINT_COLUMNS,
+                self.batch_size,
+                WORKOUT_POINT_TYPES,
+            )
+            skipped = 0
 
-                # Save DataFrame to CSV
-                df.to_csv(csv_file, index=False)
+            with (
+                zipfile.ZipFile(self.zip_filepath) as zf,
+                RouteParser(self.zip_filepath, self.workers) as routes,
+            ):
+                export_xml = find_export_xml(zf)
+                export_dir = export_xml.rpartition("/")[0]
+                members = set(zf.namelist())
+                logger.info(f"Parsing workout routes with {self.workers} worker(s).")
 
-                export_time = time.time() - start_time
-                logger.info(
-                    f"Exported table '{table}' to CSV in {export_time:.2f} seconds."
-                )
+                with zf.open(export_xml) as fp:
+                    for el in iter_top_level_elements(fp, "Workout"):
+                        row, route_points, route_paths = parse_workout(el)
+                        if known.get(row[0]) == row[-1]:
+                            skipped += 1
+                            continue
+                        workouts.extend([row])
+                        points.extend(route_points)
+                        for route_path in route_paths:
+                            member = f"{export_dir}/{route_path.lstrip('/')}"
+                            if member not in members:
+                                logger.warning(
+                                    f"Route file '{member}' not found in ZIP."
+                                )
+                                continue
+                            for columns in routes.submit(member, row[0]):
+                                points.extend_columns(columns)
 
-                # Import CSV into DuckDB
-                import_start_time = time.time()
-                logger.info(
-                    f"Importing table '{table}' from '{csv_file}' into DuckDB..."
-                )
+                for columns in routes.drain():
+                    points.extend_columns(columns)
 
-                if table == "workouts":
-                    con.execute(f"""
-                        CREATE OR REPLACE TABLE workouts AS
-                        SELECT *, uuid() AS workout_uuid
-                        FROM read_csv_auto('{csv_file}')
-                    """)
-                else:
-                    con.execute(
-                        f"CREATE OR REPLACE TABLE \"{table}\" AS SELECT * FROM read_csv_auto('{csv_file}')"
-                    )
-                import_time = time.time() - import_start_time
-                logger.info(
-                    f"Imported table '{table}' from CSV into DuckDB in {import_time:.2f} seconds."
+            workouts.flush()
+            points.flush()
+
+            if incremental:
+                con.execute(
+                    "CREATE OR REPLACE TABLE ingested_workouts AS "
+                    "SELECT id FROM _stage_workouts"
                 )
+                replaced = self._upsert_staged(con)
+            else:
+                con.execute(
+                    "CREATE OR REPLACE TABLE ingested_workouts AS "
+                    "SELECT id FROM workouts"
+                )
+                self._apply_enums(con)
+                replaced = 0
+
+            self._record_ingest_state(
+                con,
+                incremental=incremental,
+                workouts_ingested=workouts.row_count,
+                workouts_replaced=replaced,
+                workouts_skipped=skipped,
+                points_ingested=points.row_count,
+            )
+        finally:
+            con.close()
+
+        elapsed = time.time() - start_time
+        for writer in (workouts, points):
+            rows_per_sec = writer.row_count / elapsed if elapsed > 0 else float("inf")
+            logger.info(
+                f"Wrote {writer.row_count:,} rows to '{writer.table}' "
+                f"({rows_per_sec:,.0f} rows/sec)."
+            )
+        if incremental:
+            logger.info(f"Skipped {skipped:,} unchanged workouts.")
+        logger.info(f"Native conversion completed in {elapsed:.2f} seconds.")
+
+    def convert_sqlite_to_duckdb(self, incremental: bool = False):
+        """
+        Convert SQLite database to DuckDB, streaming each table straight from the
+        attached SQLite file.
+
+        With ``incremental`` only workouts whose id is not yet in DuckDB are copied,
+        together with their points. A new id that shares its natural key with an
+        existing workout replaces that workout, since healthkit-to-sqlite ids are
+        content hashes.
+        """
+        logger.info("Starting conversion from SQLite to DuckDB...")
+
+        con = self._connect()
+        con.execute("INSTALL sqlite;")
+        con.execute("LOAD sqlite;")
+        con.execute(f"ATTACH '{self.sqlite_filepath}' AS tmp_sqlite (TYPE sqlite);")
+
+        try:
+            incremental = incremental and self._has_tables(con)
+            if incremental:
+                self._merge_new_sqlite_workouts(con)
+            else:
+                self._copy_sqlite_tables(con)
 
             # Drop tables that are not in tables_to_keep
-            con.execute(f"ATTACH '{self.sqlite_filepath}' AS tmp_sqlite (TYPE sqlite);")
             con.execute("USE tmp_sqlite;")
             tables = [row[0] for row in con.execute("SHOW TABLES;").fetchall()]
             tables_to_drop = set(tables) - set(self.tables_to_keep)
             for table in tables_to_drop:
                 logger.info(f"Dropping table '{table}'...")
                 con.execute(f'DROP TABLE IF EXISTS "{table}";')
+            con.execute("USE main;")
 
         finally:
-            sqlite_con.close()  # Close SQLite connection
+            con.close()
             logger.info("Conversion completed successfully!")
 
-    def run(self, force: bool = False):
-        """Run the full conversion pipeline."""
-        self.convert_zip_to_sqlite(force=force)
-        self.convert_sqlite_to_duckdb()
+    def _copy_sqlite_tables(self, con: duckdb.DuckDBPyConnection):
+        for table in self.tables_to_keep:
+            start_time = time.time()
+            logger.info(f"Transferring table '{table}' from SQLite into DuckDB...")
+
+            # DuckDB's sqlite scanner streams the source rows in vectors, so
+            # nothing is materialised in Python or written to disk in between
+            if table == "workouts":
+                con.execute(f"""
+                    CREATE OR REPLACE TABLE main.workouts AS
+                    SELECT {self._sqlite_select_sql(con, table)}, uuid() AS workout_uuid
+                    FROM tmp_sqlite.workouts
+                """)
+            elif table == "workout_points":
+                con.execute(f"""
+                    CREATE OR REPLACE TABLE main.workout_points AS
+                    SELECT {self._sqlite_select_sql(con, table)}
+                    FROM tmp_sqlite.workout_points
+                """)
+            else:
+                con.execute(
+                    f'CREATE OR REPLACE TABLE main."{table}" AS '
+                    f'SELECT * FROM tmp_sqlite."{table}"'
+                )
+
+            row_count = con.execute(f'SELECT count(*) FROM main."{table}"').fetchone()[
+                0
+            ]
+            transfer_time = time.time() - start_time
+            rows_per_sec = (
+                row_count / transfer_time if transfer_time > 0 else float("inf")
+            )
+            logger.info(
+                f"Transferred {row_count:,} rows of '{table}' "
+                f"in {transfer_time:.2f} seconds ({rows_per_sec:,.0f} rows/sec)."
+            )
+
+        self._apply_enums(con)
+        con.execute(
+            "CREATE OR REPLACE TABLE ingested_workouts AS SELECT id FROM main.workouts"
+        )
+        workouts_ingested, points_ingested = con.execute("""
+            SELECT
+                (SELECT count(*) FROM main.workouts),
+                (SELECT count(*) FROM main.workout_points)
+        """).fetchone()
+        self._record_ingest_state(
+            con,
+            incremental=False,
+            workouts_ingested=workouts_ingested,
+            workouts_replaced=0,
+            workouts_skipped=0,
+            points_ingested=points_ingested,
+        )
+
+    def _merge_new_sqlite_workouts(self, con: duckdb.DuckDBPyConnection):
+        start_time = time.time()
+        con.execute("""
+            CREATE OR REPLACE TABLE ingested_workouts AS
+            SELECT id FROM tmp_sqlite.workouts
+            EXCEPT
+            SELECT id FROM main.workouts
+        """)
+        con.execute(f"""
+            CREATE TEMP TABLE _stage_workouts AS
+            SELECT {self._sqlite_select_sql(con, "workouts")}, uuid() AS workout_uuid
+            FROM tmp_sqlite.workouts
+            WHERE id IN (SELECT id FROM ingested_workouts)
+        """)
+        con.execute(f"""
+            CREATE TEMP TABLE _stage_workout_points AS
+            SELECT {self._sqlite_select_sql(con, "workout_points")}
+            FROM tmp_sqlite.workout_points
+            WHERE workout_id IN (SELECT id FROM ingested_workouts)
+        """)
+        workouts_ingested, points_ingested, skipped = con.execute("""
+            SELECT
+                (SELECT count(*) FROM _stage_workouts),
+                (SELECT count(*) FROM _stage_workout_points),
+                (SELECT count(*) FROM tmp_sqlite.workouts)
+                    - (SELECT count(*) FROM _stage_workouts)
+        """).fetchone()
+        replaced = self._upsert_staged(con)
+        self._record_ingest_state(
+            con,
+            incremental=True,
+            workouts_ingested=workouts_ingested,
+            workouts_replaced=replaced,
+            workouts_skipped=skipped,
+            points_ingested=points_ingested,
+        )
+        logger.info(
+            f"Merged {workouts_ingested:,} new workouts "
+            f"({replaced:,} replacing older versions) and {points_ingested:,} points "
+            f"in {time.time() - start_time:.2f} seconds; "
+            f"skipped {skipped:,} workouts already present."
+        )
+
+    @staticmethod
+    def _sqlite_select_sql(con: duckdb.DuckDBPyConnection, table: str) -> str:
+        columns = [
+            row[0] for row in con.execute(f'DESCRIBE tmp_sqlite."{table}"').fetchall()
+        ]
+        types = WORKOUT_TYPES if table == "workouts" else WORKOUT_POINT_TYPES
+        return typed_select_sql(columns, types)
+
+    @staticmethod
+    def _enums_as_varchar_sql() -> str:
+        casts = ", ".join(f'CAST("{c}" AS VARCHAR) AS "{c}"' for c in WORKOUT_ENUMS)
+        return f"* REPLACE ({casts})"
+
+    @staticmethod
+    def _apply_enums(con: duckdb.DuckDBPyConnection):
+        """
+        Store the WORKOUT_ENUMS columns of workouts as ENUM types built from the values
+        present.
+        """
+        columns = {row[0] for row in con.execute("DESCRIBE workouts").fetchall()}
+        for column, type_name in WORKOUT_ENUMS.items():
+            if column not in columns:
+                continue
+            con.execute(f'ALTER TABLE workouts ALTER "{column}" TYPE VARCHAR')
+            con.execute(f"DROP TYPE IF EXISTS {type_name}")
+            con.execute(f"""
+                CREATE TYPE {type_name} AS ENUM (
+                    SELECT DISTINCT "{column}" FROM workouts
+                    WHERE "{column}" IS NOT NULL ORDER BY 1
+                )
+            """)
+            con.execute(f'ALTER TABLE workouts ALTER "{column}" TYPE {type_name}')
+
+    @staticmethod
+    def _has_table(con: duckdb.DuckDBPyConnection, table: str) -> bool:
+        return (
+            con.execute(
+                "SELECT count(*) FROM duckdb_tables() "
+                "WHERE database_name = current_database() AND table_name = ?",
+                [table],
+            ).fetchone()[0]
+            > 0
+        )
+
+    @staticmethod
+    def _has_tables(con: duckdb.DuckDBPyConnection) -> bool:
+        existing = {
+            row[0]
+            for row in con.execute(
+                "SELECT table_name FROM duckdb_tables() "
+                "WHERE database_name = current_database()"
+            ).fetchall()
+        }
+        has_tables = {"workouts", "workout_points"} <= existing
+        if not has_tables:
+            logger.info(
+                "No existing workouts in DuckDB; running a full ingest instead."
+            )
+        return has_tables
+
+    @staticmethod
+    def _upsert_staged(con: duckdb.DuckDBPyConnection) -> int:
+        """
+        Upsert _stage_workouts/_stage_workout_points into the main tables in one
+        transaction.
+
+        Existing workouts matching a staged workout on id or natural key are deleted
+        together with their points before the staged rows are inserted. Returns the
+        number replaced.
+        """
+        # Workouts from a newer export may carry columns (e.g. new metadata_* keys)
+        # that the existing table does not have yet
+        for table in ("workouts", "workout_points"):
+            existing = {row[0] for row in con.execute(f"DESCRIBE {table}").fetchall()}
+            for name, dtype, *_ in con.execute(f"DESCRIBE _stage_{table}").fetchall():
+                if name not in existing:
+                    con.execute(f'ALTER TABLE {table} ADD COLUMN "{name}" {dtype}')
+
+        key = " AND ".join(
+            f'CAST(w."{k}" AS VARCHAR) IS NOT DISTINCT FROM CAST(s."{k}" AS VARCHAR)'
+            for k in WORKOUT_NATURAL_KEY
+        )
+        con.execute("BEGIN TRANSACTION")
+        try:
+            # Staged workouts may bring enum values the current types do not have
+            for column in WORKOUT_ENUMS:
+                con.execute(f'ALTER TABLE workouts ALTER "{column}" TYPE VARCHAR')
+            con.execute(f"""
+                CREATE OR REPLACE TEMP TABLE _replaced AS
+                SELECT DISTINCT w.id
+                FROM workouts w
+                JOIN _stage_workouts s ON w.id = s.id OR ({key})
+            """)
+            con.execute(
+                "DELETE FROM workout_points "
+                "WHERE workout_id IN (SELECT id FROM _replaced)"
+            )
+            con.execute("DELETE FROM workouts WHERE id IN (SELECT id FROM _replaced)")
+            con.execute("INSERT INTO workouts BY NAME SELECT * FROM _stage_workouts")
+            # Keep each workout's points contiguous so the appended rows can be
+            # indexed in workout_point_ranges without re-clustering the table
+            con.execute("""
+                INSERT INTO workout_points BY NAME
+                SELECT * FROM _stage_workout_points ORDER BY workout_id, date
+            """)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        HealthKitConverter._apply_enums(con)
+        return con.execute("SELECT count(*) FROM _replaced").fetchone()[0]
+
+    def _record_ingest_state(
+        self,
+        con: duckdb.DuckDBPyConnection,
+        incremental: bool,
+        workouts_ingested: int,
+        workouts_replaced: int,
+        workouts_skipped: int,
+        points_ingested: int,
+    ):
+        """
+        Append this run to ingest_state, with the newest workout creationDate as its
+        watermark.
+        """
+        if not incremental:
+            con.execute("DROP TABLE IF EXISTS ingest_state")
+        con.execute(INGEST_STATE_DDL)
+        watermark = con.execute(
+            "SELECT CAST(max(creationDate) AS VARCHAR) FROM workouts"
+        ).fetchone()[0]
+        previous = con.execute(
+            "SELECT watermark FROM ingest_state ORDER BY ingested_at DESC LIMIT 1"
+        ).fetchone()
+        if previous:
+            logger.info(f"Previous watermark {previous[0]}, new watermark {watermark}.")
+        con.execute(
+            """
+            INSERT INTO ingest_state
+                (source, engine, mode, workouts_ingested, workouts_replaced,
+                 workouts_skipped, points_ingested, watermark)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                str(
+                    self.zip_filepath
+                    if self.engine == "native"
+                    else self.sqlite_filepath
+                ),
+                self.engine,
+                "incremental" if incremental else "full",
+                workouts_ingested,
+                workouts_replaced,
+                workouts_skipped,
+                points_ingested,
+                watermark,
+            ],
+        )
+
+    def cluster_workout_points(self, incremental: bool = False):
+        """
+        Store workout_points sorted by (workout_id, date) and index each workout's row
+        range.
+
+        Sorting makes DuckDB's zone maps prune a per-workout lookup down to the few row
+        groups holding that workout, and workout_point_ranges records the first/last
+        rowid of every workout so the analyser can read a track as one contiguous range.
+        After an incremental run that only appended workouts, the existing rows (and
+        their rowids) are untouched and only the new ranges are added; otherwise the
+        table is re-sorted.
+        """
+        start_time = time.time()
+        con = self._connect()
+        try:
+            last_run = (
+                con.execute(
+                    "SELECT mode, workouts_replaced FROM ingest_state "
+                    "ORDER BY ingested_at DESC LIMIT 1"
+                ).fetchone()
+                if self._has_table(con, "ingest_state")
+                else None
+            )
+            append_only = (
+                incremental
+                and last_run == ("incremental", 0)
+                and self._has_table(con, "workout_point_ranges")
+            )
+            if append_only:
+                scope = "WHERE workout_id IN (SELECT id FROM ingested_workouts)"
+                con.execute(
+                    "DELETE FROM workout_point_ranges "
+                    "WHERE workout_id IN (SELECT id FROM ingested_workouts)"
+                )
+            else:
+                logger.info("Sorting workout_points by (workout_id, date)...")
+                con.execute("""
+                    CREATE OR REPLACE TABLE workout_points AS
+                    SELECT * FROM workout_points ORDER BY workout_id, date
+                """)
+                con.execute("""
+                    CREATE OR REPLACE TABLE workout_point_ranges (
+                        workout_id VARCHAR,
+                        first_row BIGINT,
+                        last_row BIGINT,
+                        point_count BIGINT
+                    )
+                """)
+                scope = ""
+
+            # Only contiguous workouts get a range; any others are left to the
+            # plain workout_id lookup
+            con.execute(f"""
+                INSERT INTO workout_point_ranges
+                SELECT workout_id, min(rowid), max(rowid), count(*)
+                FROM workout_points
+                {scope}
+                GROUP BY workout_id
+                HAVING max(rowid) - min(rowid) + 1 = count(*)
+            """)
+            indexed = con.execute(
+                "SELECT count(*) FROM workout_point_ranges"
+            ).fetchone()[0]
+        finally:
+            con.close()
+
+        mode = "appended new ranges" if append_only else "re-sorted table"
+        logger.info(
+            f"Clustered workout_points ({mode}); {indexed:,} workouts indexed in "
+            f"{time.time() - start_time:.2f} seconds."
+        )
+
+    def summarise_workouts(self, incremental: bool = False):
+        """
+        Materialise one workout_summary row per workout from its points.
+
+        Each row holds the start/end position and time, the bounding box, the point
+        count, the haversine track length, the elevation gain and the moving time
+        (segments at or above MOVING_SPEED_MPS). Incremental runs only recompute
+        workouts from the last ingest and drop summaries of workouts that no longer
+        exist.
+        """
+        start_time = time.time()
+        con = self._connect()
+        try:
+            incremental = incremental and self._has_table(con, "workout_summary")
+            scope = (
+                "WHERE workout_id IN (SELECT id FROM ingested_workouts)"
+                if incremental
+                else ""
+            )
+            summary_sql = f"""
+                WITH segments AS (
+                    SELECT
+                        workout_id,
+                        date,
+                        latitude,
+                        longitude,
+                        altitude,
+                        lag(date) OVER track AS prev_date,
+                        lag(latitude) OVER track AS prev_latitude,
+                        lag(longitude) OVER track AS prev_longitude,
+                        lag(altitude) OVER track AS prev_altitude
+                    FROM workout_points
+                    {scope}
+                    WINDOW track AS (PARTITION BY workout_id ORDER BY date)
+                ),
+                measured AS (
+                    SELECT
+                        *,
+                        {SEGMENT_KM_SQL} AS segment_km,
+                        epoch(date - prev_date) AS segment_s
+                    FROM segments
+                )
+                SELECT
+                    workout_id,
+                    min(date) AS start_time,
+                    max(date) AS end_time,
+                    arg_min(latitude, date) AS start_latitude,
+                    arg_min(longitude, date) AS start_longitude,
+                    arg_max(latitude, date) AS end_latitude,
+                    arg_max(longitude, date) AS end_longitude,
+                    min(latitude) AS min_latitude,
+                    min(longitude) AS min_longitude,
+                    max(latitude) AS max_latitude,
+                    max(longitude) AS max_longitude,
+                    count(*) AS point_count,
+                    coalesce(sum(segment_km), 0) AS distance_km,
+                    coalesce(sum(greatest(altitude - prev_altitude, 0)), 0)
+                        AS elevation_gain_m,
+                    coalesce(
+                        sum(segment_s) FILTER (
+                            WHERE segment_s > 0
+                              AND segment_km * 1000 / segment_s >= {MOVING_SPEED_MPS}
+                        ),
+                        0
+                    ) AS moving_time_s
+                FROM measured
+                GROUP BY workout_id
+            """
+            if incremental:
+                con.execute("""
+                    DELETE FROM workout_summary
+                    WHERE workout_id IN (SELECT id FROM ingested_workouts)
+                       OR workout_id NOT IN (SELECT id FROM workouts)
+                """)
+                con.execute(f"INSERT INTO workout_summary BY NAME {summary_sql}")
+            else:
+                con.execute(f"CREATE OR REPLACE TABLE workout_summary AS {summary_sql}")
+            summarised = con.execute("SELECT count(*) FROM workout_summary").fetchone()[
+                0
+            ]
+        finally:
+            con.close()
+
+        logger.info(
+            f"Summarised workouts ({summarised:,} in workout_summary) "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+
+    def index_workout_grid(self, incremental: bool = False):
+        """
+        Build the workout_grid spatial index: one row per workout and grid cell its
+        track passes through.
+
+        Cells are GRID_CELL_DEG squares; each row keeps the extent and count of the
+        workout's points inside that cell. The table is sorted by cell, so DuckDB's zone
+        maps let bounding-box and radius queries skip almost all of it. Incremental runs
+        only re-index workouts from the last ingest.
+        """
+        start_time = time.time()
+        con = self._connect()
+        try:
+            incremental = incremental and self._has_table(con, "workout_grid")
+            scope = (
+                "AND workout_id IN (SELECT id FROM ingested_workouts)"
+                if incremental
+                else ""
+            )
+            grid_sql = f"""
+                SELECT
+                    CAST(floor(latitude / {GRID_CELL_DEG}) AS INTEGER) AS cell_latitude,
+                    CAST(floor(longitude / {GRID_CELL_DEG}) AS INTEGER)
+                        AS cell_longitude,
+                    workout_id,
+                    min(latitude) AS min_latitude,
+                    min(longitude) AS min_longitude,
+                    max(latitude) AS max_latitude,
+                    max(longitude) AS max_longitude,
+                    count(*) AS point_count
+                FROM workout_points
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL {scope}
+                GROUP BY ALL
+            """
+            if incremental:
+                con.execute(f"""
+                    CREATE OR REPLACE TABLE workout_grid AS
+                    SELECT * FROM workout_grid
+                    WHERE workout_id NOT IN (SELECT id FROM ingested_workouts)
+                      AND workout_id IN (SELECT id FROM workouts)
+                    UNION ALL
+                    {grid_sql}
+                    ORDER BY cell_latitude, cell_longitude
+                """)
+            else:
+                con.execute(f"""
+                    CREATE OR REPLACE TABLE workout_grid AS
+                    {grid_sql}
+                    ORDER BY cell_latitude, cell_longitude
+                """)
+            cells, workouts = con.execute(
+                "SELECT count(*), count(DISTINCT workout_id) FROM workout_grid"
+            ).fetchone()
+        finally:
+            con.close()
+
+        logger.info(
+            f"Indexed {workouts:,} workouts in {cells:,} grid cells "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+
+    def link_workout_continuations(self, incremental: bool = False):
+        """
+        Build the workout_continuations graph from workout_summary.
+
+        An edge runs from workout A to workout B when B starts within
+        CONTINUATION_MAX_KM of where A ended and no more than CONTINUATION_MAX_GAP_HOURS
+        after it, with the join distance and gap on the edge. Edges also always point
+        to a later start (ties broken by workout id), so zero-duration workouts at the
+        same time cannot link to each other both ways and the graph is acyclic. It is
+        small and always rebuilt in full; ``incremental`` is accepted for symmetry with
+        the other stages.
+        """
+        start_time = time.time()
+        con = self._connect()
+        try:
+            if not self._has_table(con, "workout_summary"):
+                logger.warning(
+                    "No workout_summary table; skipping workout continuations."
+                )
+                return
+            distance_sql = haversine_sql(
+                "a.end_latitude",
+                "a.end_longitude",
+                "b.start_latitude",
+                "b.start_longitude",
+            )
+            con.execute(f"""
+                CREATE OR REPLACE TABLE workout_continuations AS
+                SELECT
+                    a.workout_id AS from_workout_id,
+                    b.workout_id AS to_workout_id,
+                    {distance_sql} AS distance_km,
+                    epoch(b.start_time - a.end_time) / 3600 AS gap_hours
+                FROM workout_summary a
+                JOIN workout_summary b
+                    ON b.start_time >= a.end_time
+                   AND b.start_time
+                       <= a.end_time + INTERVAL {CONTINUATION_MAX_GAP_HOURS} HOUR
+                WHERE (
+                        b.start_time > a.start_time
+                        OR (
+                            b.start_time = a.start_time
+                            AND b.workout_id > a.workout_id
+                        )
+                    )
+                  AND {distance_sql} <= {CONTINUATION_MAX_KM}
+                ORDER BY from_workout_id, gap_hours
+            """)
+            edges = con.execute(
+                "SELECT count(*) FROM workout_continuations"
+            ).fetchone()[0]
+        finally:
+            con.close()
+
+        logger.info(
+            f"Linked {edges:,} workout continuations "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+
+    def simplify_workout_points(self, incremental: bool = False):
+        """
+        Store the Douglas-Peucker significance of workout points in
+        workout_points_simplified.
+
+        Only points significant at SIMPLIFY_MIN_TOLERANCE_M or more are kept, so a track
+        at any coarser tolerance is a plain ``significance_m >= tolerance`` filter on a
+        table much smaller than workout_points. Coordinates are streamed in workout
+        order and processed in chunks of whole workouts; only the rowids and
+        significance of kept points come back to DuckDB, which joins them to the full
+        rows. Incremental runs only simplify workouts from the last ingest.
+        """
+        start_time = time.time()
+        con = self._connect()
+        try:
+            incremental = incremental and self._has_table(
+                con, "workout_points_simplified"
+            )
+            scope = (
+                "AND workout_id IN (SELECT id FROM ingested_workouts)"
+                if incremental
+                else ""
+            )
+            con.execute("""
+                CREATE OR REPLACE TEMP TABLE _point_significance (
+                    point_rowid BIGINT,
+                    significance_m DOUBLE
+                )
+            """)
+            writer = BatchWriter(
+                con,
+                "_point_significance",
+                ["point_rowid", "significance_m"],
+                self.batch_size,
+            )
+
+            reader = con.cursor()
+            reader.execute(f"""
+                SELECT rowid AS point_rowid, workout_id, latitude, longitude
+                FROM workout_points
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL {scope}
+                ORDER BY workout_id, date, rowid
+            """)
+            carry = None
+            while True:
+                chunk = reader.fetch_df_chunk(max(1, self.batch_size // 2048))
+                done = chunk.empty
+                if carry is not None:
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                    carry = None
+                if chunk.empty:
+                    break
+                ids = chunk["workout_id"].to_numpy()
+                if not done:
+                    # The last workout may continue in the next chunk
+                    boundaries = np.flatnonzero(ids[1:] != ids[:-1])
+                    if not len(boundaries):
+                        carry = chunk
+                        continue
+                    tail = boundaries[-1] + 1
+                    chunk, carry = (
+                        chunk.iloc[:tail],
+                        chunk.iloc[tail:].reset_index(drop=True),
+                    )
+                    ids = ids[:tail]
+                track_starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+                significance = douglas_peucker_significance(
+                    chunk["latitude"].to_numpy(),
+                    chunk["longitude"].to_numpy(),
+                    track_starts,
+                )
+                kept = significance >= SIMPLIFY_MIN_TOLERANCE_M
+                writer.extend_columns(
+                    {
+                        "point_rowid": chunk["point_rowid"].to_numpy()[kept],
+                        "significance_m": significance[kept],
+                    }
+                )
+                if done:
+                    break
+            writer.flush()
+            reader.close()
+
+            simplified = """
+                SELECT
+                    p.workout_id, p.date, p.latitude, p.longitude, p.altitude,
+                    s.significance_m
+                FROM workout_points p
+                JOIN _point_significance s ON p.rowid = s.point_rowid
+            """
+            if incremental:
+                simplified = f"""
+                    SELECT * FROM workout_points_simplified
+                    WHERE workout_id NOT IN (SELECT id FROM ingested_workouts)
+                      AND workout_id IN (SELECT id FROM workouts)
+                    UNION ALL
+                    {simplified}
+                """
+            con.execute(f"""
+                CREATE OR REPLACE TABLE workout_points_simplified AS
+                {simplified}
+                ORDER BY workout_id, date
+            """)
+            con.execute("DROP TABLE _point_significance")
+            kept_points = con.execute(
+                "SELECT count(*) FROM workout_points_simplified"
+            ).fetchone()[0]
+        finally:
+            con.close()
+
+        logger.info(
+            f"Simplified workout points "
+            f"({kept_points:,} kept at >= {SIMPLIFY_MIN_TOLERANCE_M} m) "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+
+    def shred_workout_statistics(self, incremental: bool = False):
+        """
+        Unnest the workout_statistics JSON column into a typed workout_statistics table.
+
+        One row per workout and statistic (distance, active energy, heart rate, ...)
+        with DOUBLE sum/average/minimum/maximum and the unit, parsed once with DuckDB's
+        JSON functions so statistics across workouts can be aggregated in a single
+        query. Incremental runs only re-shred workouts from the last ingest.
+        """
+        start_time = time.time()
+        con = self._connect()
+        try:
+            columns = {row[0] for row in con.execute("DESCRIBE workouts").fetchall()}
+            if "workout_statistics" not in columns:
+                logger.warning(
+                    "workouts has no workout_statistics column; nothing to shred."
+                )
+                return
+
+            incremental = incremental and self._has_table(con, "workout_statistics")
+            scope = (
+                "AND w.id IN (SELECT id FROM ingested_workouts)" if incremental else ""
+            )
+            statistics_sql = f"""
+                SELECT
+                    w.id AS workout_id,
+                    s.type AS statistic_type,
+                    {healthkit_timestamp_sql("s.startDate")} AS start_time,
+                    {healthkit_timestamp_sql("s.endDate")} AS end_time,
+                    TRY_CAST(s.sum AS DOUBLE) AS sum,
+                    TRY_CAST(s.average AS DOUBLE) AS average,
+                    TRY_CAST(s.minimum AS DOUBLE) AS minimum,
+                    TRY_CAST(s.maximum AS DOUBLE) AS maximum,
+                    s.unit
+                FROM workouts w,
+                    unnest(
+                        from_json(
+                            w.workout_statistics, '{WORKOUT_STATISTICS_JSON_TYPE}'
+                        )
+                    ) AS u(s)
+                WHERE w.workout_statistics IS NOT NULL {scope}
+            """
+            if incremental:
+                con.execute("""
+                    DELETE FROM workout_statistics
+                    WHERE workout_id IN (SELECT id FROM ingested_workouts)
+                       OR workout_id NOT IN (SELECT id FROM workouts)
+                """)
+                con.execute(f"INSERT INTO workout_statistics {statistics_sql}")
+            else:
+                con.execute(
+                    f"CREATE OR REPLACE TABLE workout_statistics AS {statistics_sql}"
+                )
+            shredded = con.execute(
+                "SELECT count(*) FROM workout_statistics"
+            ).fetchone()[0]
+        finally:
+            con.close()
+
+        logger.info(
+            f"Shredded workout statistics ({shredded:,} rows) "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+
+    def export_parquet(self, incremental: bool = False):
+        """
+        Write workouts and workout_points as zstd-compressed Parquet datasets.
+
+        Both are Hive-partitioned by year/month of the workout's startDate
+        (``<parquet_dirpath>/<table>/year=YYYY/month=M/``), so readers can prune by date
+        without DuckDB's single-writer lock on the database file. Points are sorted by
+        workout and time within each partition. With ``incremental`` only the partitions
+        holding workouts from the last ingest run are rewritten.
+        """
+        start_time = time.time()
+        logger.info(f"Exporting Parquet dataset to '{self.parquet_dirpath}'...")
+
+        con = self._connect(read_only=True)
+        try:
+            partitioned = f"""
+                SELECT
+                    w.id,
+                    year({PARTITION_DATE_SQL}) AS year,
+                    month({PARTITION_DATE_SQL}) AS month
+                FROM workouts w
+            """
+            if incremental:
+                partitions = con.execute(f"""
+                    SELECT DISTINCT p.year, p.month
+                    FROM ({partitioned}) p
+                    WHERE p.id IN (SELECT id FROM ingested_workouts)
+                """).fetchall()
+                partition_filter = "(p.year, p.month) IN (SELECT * FROM _partitions)"
+                con.execute("CREATE TEMP TABLE _partitions (year BIGINT, month BIGINT)")
+                con.executemany("INSERT INTO _partitions VALUES (?, ?)", partitions)
+                write_mode = "OVERWRITE_OR_IGNORE true"
+            else:
+                partitions = []
+                partition_filter = "true"
+                write_mode = "OVERWRITE true"
+
+            queries = {
+                "workouts": f"""
+                    SELECT w.*, p.year, p.month
+                    FROM workouts w JOIN ({partitioned}) p ON w.id = p.id
+                    WHERE {partition_filter}
+                    ORDER BY w.startDate
+                """,
+                "workout_points": f"""
+                    SELECT wp.*, p.year, p.month
+                    FROM workout_points wp
+                    JOIN ({partitioned}) p ON wp.workout_id = p.id
+                    WHERE {partition_filter}
+                    ORDER BY wp.workout_id, wp.date
+                """,
+            }
+            for table, query in queries.items():
+                table_dir = self.parquet_dirpath / table
+                table_dir.mkdir(parents=True, exist_ok=True)
+                for year, month in partitions:
+                    shutil.rmtree(
+                        table_dir / f"year={year}" / f"month={month}",
+                        ignore_errors=True,
+                    )
+                con.execute(f"""
+                    COPY ({query}) TO '{table_dir}' (
+                        FORMAT parquet,
+                        COMPRESSION zstd,
+                        PARTITION_BY (year, month),
+                        ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE},
+                        {write_mode}
+                    )
+                """)
+
+            # Small per-workout tables are rewritten whole, as a single file each
+            for table in (
+                "workout_summary",
+                "workout_statistics",
+                "workout_grid",
+                "workout_continuations",
+                "workout_points_simplified",
+            ):
+                if self._has_table(con, table):
+                    con.execute(f"""
+                        COPY {table} TO '{self.parquet_dirpath / table}.parquet'
+                        (FORMAT parquet, COMPRESSION zstd)
+                    """)
+        finally:
+            con.close()
+
+        scope = f"{len(partitions)} partition(s)" if incremental else "all partitions"
+        logger.info(
+            f"Exported Parquet dataset ({scope}) "
+            f"in {time.time() - start_time:.2f} seconds."
+        )
+
+    def _manifest_key(self, incremental: bool) -> Dict:
+        """
+        Everything that determines the output: input checksum and conversion options.
+        """
+        key = {
+            "zip_sha256": file_sha256(self.zip_filepath),
+            "engine": self.engine,
+            "incremental": incremental,
+            "tables_to_keep": sorted(self.tables_to_keep),
+            "parquet_dirpath": str(self.parquet_dirpath)
+            if self.parquet_dirpath
+            else None,
+        }
+        # The database an incremental run builds on is not part of the key: publishing
+        # replaces it, so its fingerprint would never match on the next run. run()
+        # checks it against the fingerprint recorded by the 'publish' stage instead.
+        return key
+
+    @contextmanager
+    def _building(self):
+        """
+        Point the stages at the partial build file instead of the published output.
+        """
+        self._working_filepath = self.partial_filepath
+        try:
+            yield
+        finally:
+            self._working_filepath = None
+
+    def _ingest(self, incremental: bool):
+        """
+        Start a fresh partial build (seeded from the output when incremental) and ingest
+        into it.
+        """
+        partial = self.partial_filepath
+        for fp in (partial, partial.with_name(partial.name + ".wal")):
+            fp.unlink(missing_ok=True)
+        if incremental and self.duckdb_filepath.exists():
+            shutil.copy2(self.duckdb_filepath, partial)
+        with self._building():
+            if self.engine == "native":
+                self.convert_zip_to_duckdb(incremental=incremental)
+            else:
+                self.convert_sqlite_to_duckdb(incremental=incremental)
+
+    def _publish(self) -> Dict:
+        """Atomically rename the finished build over the output database."""
+        self.duckdb_filepath.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.partial_filepath, self.duckdb_filepath)
+        logger.info(f"Published '{self.duckdb_filepath}'.")
+        return {"output": file_fingerprint(self.duckdb_filepath)}
+
+    def _stages(
+        self, incremental: bool
+    ) -> List[Tuple[str, Callable[[], Optional[Dict]]]]:
+        """
+        The pipeline in order; every stage before 'publish' writes to the partial build.
+        """
+
+        def on_build(step: Callable[..., None]) -> Callable[[], None]:
+            def stage():
+                with self._building():
+                    step(incremental=incremental)
+
+            return stage
+
+        def sqlite_stage() -> Dict:
+            self.convert_zip_to_sqlite(force=True)
+            return {"output": file_fingerprint(self.sqlite_filepath)}
+
+        stages: List[Tuple[str, Callable[[], Optional[Dict]]]] = []
+        if self.engine == "sqlite":
+            stages.append(("sqlite", sqlite_stage))
+        stages += [
+            ("ingest", lambda: self._ingest(incremental)),
+            ("cluster", on_build(self.cluster_workout_points)),
+            ("summary", on_build(self.summarise_workouts)),
+            ("grid", on_build(self.index_workout_grid)),
+            ("continuations", on_build(self.link_workout_continuations)),
+            ("simplify", on_build(self.simplify_workout_points)),
+            ("statistics", on_build(self.shred_workout_statistics)),
+            ("publish", self._publish),
+        ]
+        if self.parquet_dirpath is not None:
+            stages.append(
+                ("parquet", lambda: self.export_parquet(incremental=incremental))
+            )
+        return stages
+
+    def run(self, force: bool = False, incremental: bool = False):
+        """
+        Run the conversion pipeline as checkpointed stages, or only ingest new/changed
+        workouts with ``incremental``.
+
+        The database is built at ``<duckdb>.partial`` and atomically renamed over the
+        output once every stage before 'publish' has finished, so readers never see a
+        half-built file. Completed stages are recorded in ``<duckdb>.manifest.json``
+        alongside a checksum of the export ZIP; a rerun with the same inputs and options
+        resumes after the last completed stage. It only counts as up to date while the
+        output still matches the fingerprint recorded when it was published, so a
+        deleted or replaced database is rebuilt. ``force`` discards previous progress.
+        """
+        if not self.zip_filepath.exists():
+            logger.error(f"The zip file '{self.zip_filepath}' does not exist.")
+            sys.exit(1)
+
+        manifest = ConversionManifest.load(
+            self.manifest_filepath, self._manifest_key(incremental)
+        )
+        stages = self._stages(incremental)
+        if force:
+            manifest.reset()
+
+        # Progress is only trustworthy while the files it refers to are still ours
+        published = manifest.completed.get("publish")
+        output_intact = (
+            published is not None
+            and self.duckdb_filepath.exists()
+            and file_fingerprint(self.duckdb_filepath) == published.get("output")
+        )
+        if published is None and not self.partial_filepath.exists():
+            manifest.reset(keep=("sqlite",))
+        elif published is not None and not output_intact:
+            logger.warning(
+                f"'{self.duckdb_filepath}' is missing or has changed since it was "
+                "published; rebuilding."
+            )
+            manifest.reset(keep=("sqlite",))
+        elif all(name in manifest.completed for name, _ in stages):
+            logger.info(
+                f"'{self.duckdb_filepath}' is already up to date "
+                f"with '{self.zip_filepath}'. "
+                "Use '--force' to rebuild."
+            )
+            return
+
+        # The SQLite file only matters until it has been ingested (which prunes its
+        # tables)
+        sqlite_stage = manifest.completed.get("sqlite")
+        if (
+            sqlite_stage
+            and "ingest" not in manifest.completed
+            and (
+                not self.sqlite_filepath.exists()
+                or file_fingerprint(self.sqlite_filepath) != sqlite_stage["output"]
+            )
+        ):
+            manifest.reset()
+
+        for name, stage in stages:
+            if name in manifest.completed:
+                logger.info(f"Skipping stage '{name}', already completed.")
+                continue
+            logger.info(f"Running stage '{name}'...")
+            manifest.mark(name, **(stage() or {}))
+
+        peak = peak_rss_bytes()
+        if peak is not None:
+            budget = f" (budget {self.memory_limit})" if self.memory_limit else ""
+            logger.info(
+                f"Peak RSS {peak['self'] / 2**20:,.0f} MiB{budget}; "
+                f"largest child process {peak['children'] / 2**20:,.0f} MiB."
+            )
 
 
 def parse_args() -> Dict:
@@ -147,17 +2002,51 @@ def parse_args() -> Dict:
     parser.add_argument(
         "--duckdb", type=Path, help="The filepath for the output DuckDB database."
     )
+    parser.add_argument(
+        "--parquet",
+        type=Path,
+        help="Directory for an additional Hive-partitioned Parquet copy of the output.",
+    )
     parser.add_argument(
         "--tables-to-keep",
         nargs="+",
         default=["workouts", "workout_points"],
         help="List of tables to keep in the DuckDB database.",
     )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        help="Ingest engine: 'native' streams the ZIP straight into DuckDB, "
+        "'sqlite' goes through healthkit-to-sqlite (default: native).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes parsing workout-routes GPX files "
+        "(native engine).",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        help="Memory budget for the conversion, e.g. '2GB'. Half goes to DuckDB, which "
+        "spills to disk beyond it; the rest bounds the Python-side batches and the "
+        "number of GPX worker processes.",
+    )
+    parser.add_argument("--threads", type=int, help="Number of DuckDB threads.")
+    parser.add_argument(
+        "--temp-dir",
+        type=Path,
+        help="Directory DuckDB spills to when over its memory limit.",
+    )
     parser.add_argument("--toml", type=Path, help="Path to a TOML configuration file.")
     parser.add_argument(
         "--force",
         action="store_true",
-        help="Overwrite existing SQLite database if it exists.",
+        help="Discard progress from earlier runs and rebuild every stage.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only ingest workouts that are new or changed since the last run.",
     )
 
     args = parser.parse_args()
@@ -168,15 +2057,30 @@ def parse_args() -> Dict:
             config = tomllib.load(f)
 
         # Override arguments with TOML values where applicable
+        sqlite_filepath = config["paths"].get("sqlite_filepath")
+        parquet_dirpath = config["paths"].get("parquet_dirpath")
+        temp_dirpath = config["paths"].get("temp_dirpath")
         return {
             "zip_filepath": args.zip or Path(config["paths"].get("zip_filepath")),
             "sqlite_filepath": args.sqlite
-            or Path(config["paths"].get("sqlite_filepath")),
+            or (Path(sqlite_filepath) if sqlite_filepath else None),
             "duckdb_filepath": args.duckdb
             or Path(config["paths"].get("duckdb_filepath")),
+            "parquet_dirpath": args.parquet
+            or (Path(parquet_dirpath) if parquet_dirpath else None),
             "tables_to_keep": args.tables_to_keep
             or config["parameters"].get("tables_to_keep", []),
+            "engine": args.engine or config["parameters"].get("engine", "native"),
+            "batch_size": config["parameters"].get("batch_size", 50_000),
+            "workers": args.workers or config["parameters"].get("workers", 1),
+            "memory_limit": args.memory_limit
+            or config["parameters"].get("memory_limit"),
+            "threads": args.threads or config["parameters"].get("threads"),
+            "temp_dirpath": args.temp_dir
+            or (Path(temp_dirpath) if temp_dirpath else None),
             "force": args.force,
+            "incremental": args.incremental
+            or config["parameters"].get("incremental", False),
         }
 
     # Ensure required arguments are provided
@@ -184,9 +2088,10 @@ def parse_args() -> Dict:
         raise ValueError(
             "Error: '--zip' argument is required if no TOML file is provided."
         )
-    if not args.sqlite:
+    engine = args.engine or "native"
+    if engine == "sqlite" and not args.sqlite:
         raise ValueError(
-            "Error: '--sqlite' argument is required if no TOML file is provided."
+            "Error: '--sqlite' argument is required for the 'sqlite' engine if no TOML file is provided."
         )
     if not args.duckdb:
         raise ValueError(
@@ -198,8 +2103,16 @@ def parse_args() -> Dict:
         "zip_filepath": args.zip,
         "sqlite_filepath": args.sqlite,
         "duckdb_filepath": args.duckdb,
+        "parquet_dirpath": args.parquet,
         "tables_to_keep": args.tables_to_keep,
+        "engine": engine,
+        "batch_size": 50_000,
+        "workers": args.workers or 1,
+        "memory_limit": args.memory_limit,
+        "threads": args.threads,
+        "temp_dirpath": args.temp_dir,
         "force": args.force,
+        "incremental": args.incremental,
     }
 
 
@@ -211,8 +2124,15 @@ def main():
         sqlite_filepath=config["sqlite_filepath"],
         duckdb_filepath=config["duckdb_filepath"],
         tables_to_keep=config["tables_to_keep"],
+        engine=config["engine"],
+        batch_size=config["batch_size"],
+        workers=config["workers"],
+        parquet_dirpath=config["parquet_dirpath"],
+        memory_limit=config["memory_limit"],
+        threads=config["threads"],
+        temp_dirpath=config["temp_dirpath"],
     )
-    converter.run(force=config["force"])
+    converter.run(force=config["force"], incremental=config["incremental"])
 
 
 if __name__ == "__main__":
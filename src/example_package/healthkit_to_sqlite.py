@@ -16,9 +16,9 @@ def convert_healthkit_to_sqlite(zip_filepath, sqlite_filepath):
     if sqlite_filepath.exists():
         logger.warning(f"Warning: The SQLite file '{sqlite_filepath}' already exists. It will be overwritten.")
     
-    command = f"healthkit-to-sqlite {zip_filepath} {sqlite_filepath}"
-    logger.info(command)
-    subprocess.run(command, shell=True)
+    command = ["healthkit-to-sqlite", str(zip_filepath), str(sqlite_filepath)]
+    logger.info(" ".join(command))
+    subprocess.run(command, check=True)
 
 def main():
     parser = argparse.ArgumentParser(description="Convert HealthKit export zip to SQLite database.")
@@ -0,0 +1,69 @@
+import sys
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+
+# The modules are run as scripts, so import them the same way the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "example_package"))
+
+
+def write_export(
+    path, workouts, points_per_route=20, statistics=None, blank_points=(), jitter=0.0
+):
+    """
+    Write a minimal Apple Health export ZIP with one GPX route per workout.
+
+    ``statistics`` maps a workout's index to the attributes of its WorkoutStatistics
+    elements, which default to the workout's start and end dates. Track points whose
+    index is in ``blank_points`` are written with empty coordinates. ``jitter`` moves
+    each point's latitude by up to that many degrees, deterministically, so the tracks
+    are not straight lines.
+    """
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_AU">\n']
+    routes = {}
+    for i, (start, minutes, latitude, *source) in enumerate(workouts):
+        source = source[0] if source else "Apple Watch"
+        end = start + timedelta(minutes=minutes)
+        route = f"/workout-routes/route_{start:%Y-%m-%d_%H.%M}_{i}.gpx"
+        dates = {
+            "startDate": f"{start:%Y-%m-%d %H:%M:%S %z}",
+            "endDate": f"{end:%Y-%m-%d %H:%M:%S %z}",
+        }
+        statistics_xml = "".join(
+            "<WorkoutStatistics "
+            + " ".join(f'{key}="{value}"' for key, value in {**dates, **stat}.items())
+            + "/>\n"
+            for stat in (statistics or {}).get(i, [])
+        )
+        xml.append(
+            '<Workout workoutActivityType="HKWorkoutActivityTypeWalking" '
+            f'duration="{minutes}" durationUnit="min" sourceName="{source}" '
+            f'startDate="{start:%Y-%m-%d %H:%M:%S %z}" '
+            f'endDate="{end:%Y-%m-%d %H:%M:%S %z}">\n'
+            f"{statistics_xml}"
+            f'<WorkoutRoute sourceName="{source}"><FileReference path="{route}"/>'
+            "</WorkoutRoute>\n</Workout>\n"
+        )
+        points = []
+        for k in range(points_per_route):
+            offset = jitter * ((k * 7919 + i * 104729) % 13 - 6) / 6
+            position = (
+                f'lon="{151.0 + k * 1e-4}" lat="{latitude + k * 1e-4 + offset}"'
+                if k not in blank_points
+                else 'lon="" lat=""'
+            )
+            points.append(
+                f"<trkpt {position}><ele>100</ele>"
+                f"<time>{start + timedelta(seconds=10 * k):%Y-%m-%dT%H:%M:%SZ}</time>"
+                "</trkpt>"
+            )
+        routes[route] = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+            f"<trk><trkseg>{''.join(points)}</trkseg></trk></gpx>"
+        )
+    xml.append("</HealthData>\n")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("apple_health_export/export.xml", "".join(xml))
+        for route, gpx in routes.items():
+            zf.writestr(f"apple_health_export{route}", gpx)
@@ -0,0 +1,465 @@
+import json
+import os
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import duckdb
+import folium
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from healthkit_analyser import (
+    ContinuationGraph,
+    CursorPool,
+    DiskCache,
+    EncodedPolylines,
+    HealthKitAnalyser,
+    HealthKitConfig,
+    MapRenderer,
+    MemoryCache,
+    TilePyramid,
+    encode_polyline,
+    result_nbytes,
+    slice_result,
+)
+from healthkit_converter import HealthKitConverter
+
+from tests.conftest import write_export
+
+SQL_DIR = Path(__file__).resolve().parents[1] / "sql"
+
+
+def convert(tmp_path, workouts, points_per_route=20):
+    """Convert a synthetic export and return the path of the DuckDB database."""
+    write_export(tmp_path / "export.zip", workouts, points_per_route)
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+    HealthKitConverter(
+        tmp_path / "export.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run()
+    return duckdb_filepath
+
+
+def open_analyser(db_path, cache_dir, **config):
+    config.setdefault("map_defaults", {})
+    return HealthKitAnalyser(
+        HealthKitConfig(
+            db_path=db_path,
+            sql_dir=SQL_DIR,
+            cache_dir=cache_dir,
+            **config,
+        )
+    )
+
+
+def daily_workouts(n):
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    return [(start + timedelta(days=i), 30, -33.8 + 0.01 * i) for i in range(n)]
+
+
+def test_encode_polyline_matches_reference():
+    # The worked example from Google's encoded polyline format documentation
+    coords = np.array([[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]])
+    assert encode_polyline(coords) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+def test_encoded_polylines_render_track_containing_braces():
+    track = np.array([[0.0, 0.0], [0.00974, 0.0]])
+    encoded = encode_polyline(track)
+    assert "{{" in encoded
+
+    m = folium.Map(location=[0.0, 0.0], zoom_start=14)
+    EncodedPolylines([track], {"color": "red"}).add_to(m)
+    page = m.get_root().render()
+
+    line = next(
+        line for line in page.splitlines() if ".forEach(function(track)" in line
+    )
+    tracks = json.loads(line.strip().removesuffix(".forEach(function(track) {"))
+    assert tracks == [encoded]
+
+
+def test_continuation_graph_drops_cycles():
+    # Zero-duration workouts at the same time used to be linked both ways
+    edges = pd.DataFrame(
+        [("a", "b", 0.0), ("b", "a", 0.0), ("b", "c", 0.5)],
+        columns=["from_workout_id", "to_workout_id", "distance_km"],
+    )
+    graph = ContinuationGraph(edges)
+
+    assert graph.longest_chain() == ["a", "b", "c"]
+    assert graph.journeys() == [["a", "b", "c"]]
+
+
+@pytest.mark.parametrize("output_method", ["jupyter", "streamlit"])
+def test_render_tiles_rejects_embedded_output(output_method):
+    # The check comes before anything touches the analyser or the tiles
+    renderer = MapRenderer.__new__(MapRenderer)
+    with pytest.raises(ValueError, match="console"):
+        renderer.render_tiles(output_method=output_method)
+
+
+TILE_STYLE = {"tile_min_zoom": 12, "tile_max_zoom": 14}
+
+
+def read_tiles(tile_dir):
+    return {
+        path.relative_to(tile_dir): path.read_bytes()
+        for path in sorted(tile_dir.rglob("*.png"))
+    }
+
+
+@pytest.mark.parametrize("simplified", [True, False])
+def test_tile_pyramid_skips_points_without_a_position(tmp_path, simplified):
+    # The last two points have no position, so the track is that of an 18-point route
+    tiles = {}
+    for name, points, blank_points in [("clean", 18, ()), ("blank", 20, (18, 19))]:
+        write_export(
+            tmp_path / f"{name}.zip",
+            daily_workouts(3),
+            points_per_route=points,
+            blank_points=blank_points,
+        )
+        db_path = tmp_path / f"{name}.duckdb"
+        HealthKitConverter(
+            tmp_path / f"{name}.zip", None, db_path, ["workouts", "workout_points"]
+        ).run()
+        if not simplified:
+            with duckdb.connect(str(db_path)) as con:
+                con.execute("DROP TABLE workout_points_simplified")
+        with open_analyser(
+            db_path, tmp_path / f"{name}_cache", map_defaults=TILE_STYLE
+        ) as analyser:
+            TilePyramid(analyser, tmp_path / f"{name}_tiles").build()
+        tiles[name] = read_tiles(tmp_path / f"{name}_tiles")
+    assert tiles["clean"] and tiles["blank"] == tiles["clean"]
+
+
+def test_tile_pyramid_incremental_build_matches_full_build(tmp_path):
+    workouts = daily_workouts(4)
+    db_path = convert(tmp_path, workouts)
+    with open_analyser(
+        db_path, tmp_path / "cache", map_defaults=TILE_STYLE
+    ) as analyser:
+        TilePyramid(analyser, tmp_path / "incremental").build()
+
+    # A newer export moves one workout (changing its duration, so it is re-ingested)
+    # and adds another
+    workouts[1] = (workouts[1][0], 40, -33.75)
+    workouts.append((workouts[-1][0] + timedelta(days=1), 45, -33.81))
+    write_export(tmp_path / "export_2.zip", workouts)
+    HealthKitConverter(
+        tmp_path / "export_2.zip", None, db_path, ["workouts", "workout_points"]
+    ).run(incremental=True)
+
+    with open_analyser(
+        db_path, tmp_path / "cache", map_defaults=TILE_STYLE
+    ) as analyser:
+        assert len(analyser.get_workout_summaries()) == 5
+        pyramid = TilePyramid(analyser, tmp_path / "incremental")
+        assert pyramid.build() > 0
+        assert pyramid.build() == 0
+        TilePyramid(analyser, tmp_path / "full").build(force=True)
+    assert read_tiles(tmp_path / "incremental") == read_tiles(tmp_path / "full")
+
+
+def test_point_density_counts_every_positioned_point(tmp_path):
+    write_export(tmp_path / "export.zip", daily_workouts(5), blank_points=(3, 4))
+    db_path = tmp_path / "healthkit.duckdb"
+    HealthKitConverter(
+        tmp_path / "export.zip", None, db_path, ["workouts", "workout_points"]
+    ).run()
+    with open_analyser(db_path, tmp_path / "cache") as analyser:
+        summaries = analyser.get_workout_summaries()
+        box = (
+            summaries["min_latitude"].min(),
+            summaries["min_longitude"].min(),
+            summaries["max_latitude"].max(),
+            summaries["max_longitude"].max(),
+        )
+        for zoom in (10, 16):
+            grid, bounds = analyser.point_density(*box, zoom)
+            assert grid.sum() == 5 * 18
+            (south, west), (north, east) = bounds
+            assert south <= box[0] and west <= box[1]
+            assert north >= box[2] and east >= box[3]
+
+        # Panning out reuses the cached tiles and queries only the new ones
+        wider, _ = analyser.point_density(
+            box[0] - 0.05, box[1] - 0.05, box[2] + 0.05, box[3] + 0.05, 16
+        )
+        assert wider.sum() == 5 * 18 and wider.size > grid.size
+
+
+@pytest.mark.parametrize("backend", ["memory", "disk"])
+@pytest.mark.parametrize("tolerance_m", [None, 5.0])
+def test_get_workout_points_many_matches_single_lookups(tmp_path, backend, tolerance_m):
+    db_path = convert(tmp_path, daily_workouts(6))
+    with open_analyser(db_path, tmp_path / "single") as analyser:
+        ids = list(analyser._workout_summaries()["workout_id"])
+        # Every workout has a row range, so the batched call joins on the ranges
+        assert set(ids) <= set(analyser._point_ranges)
+        single = {
+            wid: analyser.get_workout_points(wid, tolerance_m=tolerance_m)
+            for wid in ids
+        }
+
+    # Out of table order, with a repeat and a workout that has no points
+    requested = ids[1::2] + ids[::2][::-1] + [ids[1], "missing"]
+    with open_analyser(
+        db_path, tmp_path / "batched", cache_backend=backend
+    ) as analyser:
+        batched = analyser.get_workout_points_many(requested, tolerance_m=tolerance_m)
+        coords = analyser.get_workout_points_many(
+            requested, format="coords", tolerance_m=tolerance_m
+        )
+
+    assert list(batched) == list(dict.fromkeys(requested))
+    assert len(batched["missing"]) == 0 and coords["missing"].shape == (0, 2)
+    for wid in ids:
+        assert (batched[wid]["workout_id"] == wid).all()
+        pd.testing.assert_frame_equal(
+            batched[wid].reset_index(drop=True),
+            single[wid].reset_index(drop=True),
+            check_categorical=False,
+        )
+        np.testing.assert_array_equal(
+            coords[wid], single[wid][["latitude", "longitude"]].to_numpy()
+        )
+
+
+def test_disk_backend_binds_query_parameters(tmp_path):
+    db_path = convert(tmp_path, daily_workouts(3))
+    results = {}
+    for backend in ("memory", "disk"):
+        with open_analyser(
+            db_path, tmp_path / backend, cache_backend=backend
+        ) as analyser:
+            workouts = analyser.get_workouts("2024-03-01", "2024-03-02 23:59:59")
+            results[backend] = (
+                workouts,
+                analyser.get_workout_points(workouts["id"].iloc[0]),
+                # A quote in a value is bound as data, never spliced into the SQL
+                analyser.get_workout_points("o'brien"),
+            )
+
+    assert len(results["disk"][0]) == 2 and len(results["disk"][2]) == 0
+    for memory, disk in zip(results["memory"], results["disk"]):
+        pd.testing.assert_frame_equal(memory, disk, check_categorical=False)
+
+
+def put_range(cache, con, n):
+    cache.put(con, "numbers", {"n": n}, "SELECT range AS i FROM range($n)", {"n": n})
+
+
+def test_disk_cache_counts_hits_and_misses(tmp_path, monkeypatch):
+    con = duckdb.connect()
+    cache = DiskCache(tmp_path, 2**20, "source-1")
+
+    assert cache.get(con, "numbers", {"n": 3}) is None
+    put_range(cache, con, 3)
+    assert cache.get(con, "numbers", {"n": 3})["i"].tolist() == [0, 1, 2]
+    assert cache.get(con, "numbers", {"n": 4}) is None
+
+    # Another process evicting the entry between the read and the touch is still a hit
+    def evicted(path, *args, **kwargs):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", evicted)
+    columns = cache.get(con, "numbers", {"n": 3}, format="numpy")
+    assert columns["i"].tolist() == [0, 1, 2]
+    assert {k: cache.stats()[k] for k in ("hits", "misses", "entries")} == {
+        "hits": 2,
+        "misses": 2,
+        "entries": 1,
+    }
+
+
+def test_disk_cache_misses_after_the_source_changes(tmp_path):
+    con = duckdb.connect()
+    put_range(DiskCache(tmp_path, 2**20, "source-1"), con, 3)
+
+    rebuilt = DiskCache(tmp_path, 2**20, "source-2")
+    assert rebuilt.get(con, "numbers", {"n": 3}) is None
+    assert (
+        DiskCache(tmp_path, 2**20, "source-1").get(con, "numbers", {"n": 3}) is not None
+    )
+
+
+def test_disk_cache_evicts_least_recently_used_beyond_max_bytes(tmp_path):
+    con = duckdb.connect()
+    cache = DiskCache(tmp_path, 2**20, "source")
+    put_range(cache, con, 1)
+    entry_bytes = cache.stats()["bytes"]
+    cache.max_bytes = int(2.5 * entry_bytes)
+
+    now = time.time()
+    put_range(cache, con, 2)
+    for n, age in ((1, 30), (2, 20)):
+        os.utime(cache.path("numbers", {"n": n}), (now - age, now - age))
+    # Reading n=1 makes n=2 the least recently used entry
+    assert cache.get(con, "numbers", {"n": 1}) is not None
+    put_range(cache, con, 3)
+
+    assert cache.get(con, "numbers", {"n": 2}) is None
+    assert cache.get(con, "numbers", {"n": 1}) is not None
+    assert cache.get(con, "numbers", {"n": 3}) is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_memory_cache_evicts_least_recently_used_beyond_max_bytes():
+    values = {key: np.zeros(100) for key in "abcd"}
+    cache = MemoryCache(max_bytes=3 * 800)
+    for key in "abc":
+        cache.put((0, key), values[key])
+    assert cache.stats()["bytes"] == 3 * 800
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get((0, "a")) is values["a"]
+    cache.put((0, "d"), values["d"])
+    assert cache.get((0, "b")) is None
+    assert all(cache.get((0, key)) is not None for key in "acd")
+
+    # Replacing an entry does not count it twice; one over budget is not stored
+    cache.put((0, "a"), values["a"])
+    cache.put((0, "huge"), np.zeros(1000))
+    assert cache.get((0, "huge")) is None
+    assert cache.stats() == {
+        "hits": 4,
+        "misses": 2,
+        "evictions": 1,
+        "entries": 3,
+        "bytes": 3 * 800,
+    }
+
+
+def test_memory_cache_invalidates_one_owner():
+    cache = MemoryCache(max_bytes=2**20)
+    for owner in (1, 2):
+        for key in ("workouts", "points"):
+            cache.put((owner, key), np.zeros(10))
+
+    cache.invalidate(1)
+    assert cache.get((1, "workouts")) is None and cache.get((1, "points")) is None
+    assert cache.get((2, "workouts")) is not None
+    assert cache.stats()["bytes"] == 2 * 80
+
+    cache.invalidate()
+    assert cache.stats()["entries"] == cache.stats()["bytes"] == 0
+
+
+@pytest.mark.parametrize("format", ["pandas", "arrow"])
+def test_slice_result_does_not_pin_the_parent_result(format):
+    query = "SELECT range AS i, 'workout-' || (range // 100) AS workout_id FROM range(10000)"
+    parent = duckdb.sql(query).df() if format == "pandas" else duckdb.sql(query).arrow()
+    if isinstance(parent, pa.RecordBatchReader):
+        parent = parent.read_all()
+    sliced = slice_result(parent, 100, 200)
+
+    assert len(sliced) == 100
+    # The cache counts result_nbytes, so the slice must not hold more than that
+    held = (
+        pa.array(sliced["workout_id"]).get_total_buffer_size()
+        + sliced["i"].to_numpy().nbytes
+        if format == "pandas"
+        else sliced.get_total_buffer_size()
+    )
+    assert held <= 2 * result_nbytes(sliced)
+
+
+def acquire_in_thread(pool):
+    """Start a thread that takes a cursor; returns (acquired event, errors list)."""
+    acquired, errors = threading.Event(), []
+
+    def take():
+        try:
+            with pool.cursor():
+                acquired.set()
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    threading.Thread(target=take, daemon=True).start()
+    return acquired, errors
+
+
+def test_cursor_pool_blocks_at_max_size():
+    pool = CursorPool(duckdb.connect(), size=2)
+    with pool.cursor() as first, pool.cursor() as second:
+        assert first is not second
+        acquired, _ = acquire_in_thread(pool)
+        assert not acquired.wait(0.2)
+    assert acquired.wait(5)
+    assert pool._created == 2
+    pool.close()
+
+
+def test_cursor_pool_releases_on_exception():
+    pool = CursorPool(duckdb.connect(), size=1)
+    with pytest.raises(duckdb.CatalogException):
+        with pool.cursor() as cur:
+            cur.execute("SELECT * FROM no_such_table")
+    acquired, _ = acquire_in_thread(pool)
+    assert acquired.wait(5)
+    pool.close()
+
+
+def test_cursor_pool_close_closes_cursors_and_wakes_waiters():
+    pool = CursorPool(duckdb.connect(), size=2)
+    with pool.cursor() as busy:
+        with pool.cursor() as idle:
+            assert idle is not busy
+        waiting, errors = acquire_in_thread(pool)
+        assert waiting.wait(5)
+        with pool.cursor():
+            # Both cursors are taken, so this caller waits until the pool closes
+            waiting, errors = acquire_in_thread(pool)
+            time.sleep(0.1)
+            pool.close()
+            for _ in range(50):
+                if errors:
+                    break
+                time.sleep(0.1)
+            assert len(errors) == 1 and not waiting.is_set()
+
+    with pytest.raises(duckdb.ConnectionException):
+        idle.execute("SELECT 1")
+    with pytest.raises(RuntimeError):
+        with pool.cursor():
+            pass
+
+
+@pytest.mark.parametrize("backend", ["memory", "disk"])
+def test_coords_format_needs_point_columns(tmp_path, backend):
+    db_path = convert(tmp_path, daily_workouts(1))
+    with open_analyser(db_path, tmp_path / "cache", cache_backend=backend) as analyser:
+        with pytest.raises(ValueError, match="workout_points"):
+            analyser.get_workouts("2024-01-01", "2024-12-31", format="coords")
+
+
+def test_workout_statistics_need_the_statistics_stage(tmp_path):
+    statistics = {
+        i: [{"type": "HKQuantityTypeIdentifierDistanceWalkingRunning", "sum": "2.5"}]
+        for i in range(2)
+    }
+    write_export(tmp_path / "export.zip", daily_workouts(2), statistics=statistics)
+    db_path = tmp_path / "healthkit.duckdb"
+    HealthKitConverter(
+        tmp_path / "export.zip", None, db_path, ["workouts", "workout_points"]
+    ).run()
+    with open_analyser(db_path, tmp_path / "cache") as analyser:
+        workout_id = analyser.get_workouts("2024-03-01", "2024-03-31")["id"].iloc[0]
+        assert analyser.get_workout_statistics(workout_id)["sum"].tolist() == [2.5]
+        totals = analyser.aggregate_workout_statistics("2024-03-01", "2024-03-31")
+        assert totals[["workouts", "total"]].values.tolist() == [[2, 5.0]]
+
+    # A database converted before the statistics stage existed
+    with duckdb.connect(str(db_path)) as con:
+        con.execute("DROP TABLE workout_statistics")
+    with open_analyser(db_path, tmp_path / "cache") as analyser:
+        with pytest.raises(ValueError, match="re-run the converter"):
+            analyser.get_workout_statistics(workout_id)
+        with pytest.raises(ValueError, match="re-run the converter"):
+            analyser.aggregate_workout_statistics("2024-03-01", "2024-03-31")
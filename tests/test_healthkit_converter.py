@@ -0,0 +1,316 @@
+import math
+from datetime import UTC, datetime, timedelta
+
+import duckdb
+import numpy as np
+import pytest
+from healthkit_converter import (
+    BATCH_ROW_BYTES,
+    METRES_PER_DEGREE,
+    ROUTE_WORKER_BYTES,
+    SIMPLIFY_MIN_TOLERANCE_M,
+    HealthKitConverter,
+    douglas_peucker_significance,
+    parse_size,
+)
+
+from tests.conftest import write_export
+
+
+def test_incremental_native_ingest_assigns_workout_uuids(tmp_path):
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    workouts = [(start + timedelta(days=i), 60, -33.8) for i in range(3)]
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+
+    write_export(tmp_path / "export.zip", workouts)
+    HealthKitConverter(
+        tmp_path / "export.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run()
+
+    # A newer export adds a workout and changes the duration of an existing one
+    workouts[0] = (workouts[0][0], 75, -33.8)
+    workouts.append((start + timedelta(days=3), 45, -33.7))
+    write_export(tmp_path / "export_2.zip", workouts)
+    HealthKitConverter(
+        tmp_path / "export_2.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run(incremental=True)
+
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        total, ids, uuids, missing = con.execute("""
+            SELECT
+                count(*),
+                count(DISTINCT id),
+                count(DISTINCT workout_uuid),
+                count(*) FILTER (WHERE workout_uuid IS NULL)
+            FROM workouts
+        """).fetchone()
+    assert (total, ids, uuids, missing) == (4, 4, 4, 0)
+
+
+def test_run_skips_only_while_published_database_is_intact(tmp_path):
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    write_export(tmp_path / "export.zip", [(start, 60, -33.8)])
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+    converter = HealthKitConverter(
+        tmp_path / "export.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    )
+
+    for incremental in (False, True):
+        converter.run(incremental=incremental)
+        published = duckdb_filepath.stat().st_mtime_ns
+        converter.run(incremental=incremental)
+        assert duckdb_filepath.stat().st_mtime_ns == published
+
+    duckdb_filepath.unlink()
+    converter.run(incremental=True)
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        assert con.execute("SELECT count(*) FROM workouts").fetchone()[0] == 1
+
+
+def test_zero_duration_workouts_link_one_way(tmp_path):
+    # The watch and the phone both recorded the same single-point workout
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    workouts = [(start, 1, -33.8, "Apple Watch"), (start, 1, -33.8, "iPhone")]
+    write_export(tmp_path / "export.zip", workouts, points_per_route=1)
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+    HealthKitConverter(
+        tmp_path / "export.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run()
+
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        edges = con.execute("SELECT count(*) FROM workout_continuations").fetchone()[0]
+    assert edges == 1
+
+
+@pytest.mark.parametrize(
+    "memory_limit, workers", [("300MB", 1), ("1GB", 3), ("8GB", 8), (None, 8)]
+)
+def test_memory_limit_covers_route_workers(tmp_path, memory_limit, workers):
+    converter = HealthKitConverter(
+        tmp_path / "export.zip",
+        None,
+        tmp_path / "healthkit.duckdb",
+        ["workouts", "workout_points"],
+        batch_size=10_000_000,
+        workers=8,
+        memory_limit=memory_limit,
+    )
+    assert converter.workers == workers
+    if memory_limit is not None:
+        # DuckDB's half, the workers and the batches together stay within the budget
+        duckdb_bytes = int(converter.duckdb_config["memory_limit"].rstrip("B"))
+        worker_bytes = ROUTE_WORKER_BYTES * workers if workers > 1 else 0
+        batch_bytes = converter.batch_size * BATCH_ROW_BYTES
+        assert duckdb_bytes + worker_bytes + batch_bytes <= parse_size(memory_limit)
+
+
+DISTANCE = "HKQuantityTypeIdentifierDistanceWalkingRunning"
+HEART_RATE = "HKQuantityTypeIdentifierHeartRate"
+
+
+def test_workout_statistics_are_shredded_into_typed_rows(tmp_path):
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    workouts = [(start + timedelta(days=i), 60, -33.8) for i in range(2)]
+    statistics = {
+        i: [
+            {"type": DISTANCE, "sum": f"{5 + i}.5", "unit": "km"},
+            {
+                "type": HEART_RATE,
+                "average": "120",
+                "minimum": "80",
+                "maximum": "150",
+                "unit": "count/min",
+            },
+        ]
+        for i in range(2)
+    }
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+    write_export(tmp_path / "export.zip", workouts, statistics=statistics)
+    HealthKitConverter(
+        tmp_path / "export.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run()
+
+    query = """
+        SELECT
+            w.startDate,
+            s.statistic_type,
+            s.start_time = w.startDate,
+            s.sum,
+            s.average,
+            s.minimum,
+            s.maximum,
+            s.unit
+        FROM workout_statistics s
+        JOIN workouts w ON s.workout_id = w.id
+        ORDER BY w.startDate, s.statistic_type
+    """
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        types = {
+            column: column_type
+            for column, column_type, *_ in con.execute(
+                "DESCRIBE workout_statistics"
+            ).fetchall()
+        }
+        rows = con.execute(query).fetchall()
+    assert {types[c] for c in ("sum", "average", "minimum", "maximum")} == {"DOUBLE"}
+    assert types["start_time"] == types["end_time"] == "TIMESTAMP WITH TIME ZONE"
+    assert [row[1:] for row in rows] == [
+        (DISTANCE, True, 5.5, None, None, None, "km"),
+        (HEART_RATE, True, None, 120.0, 80.0, 150.0, "count/min"),
+        (DISTANCE, True, 6.5, None, None, None, "km"),
+        (HEART_RATE, True, None, 120.0, 80.0, 150.0, "count/min"),
+    ]
+
+    # An incremental run re-shreds only the workout a newer export changed
+    statistics[1][0]["sum"] = "7.25"
+    write_export(tmp_path / "export_2.zip", workouts, statistics=statistics)
+    HealthKitConverter(
+        tmp_path / "export_2.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run(incremental=True)
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        updated = con.execute(query).fetchall()
+    assert updated == rows[:2] + [(*rows[2][:3], 7.25, *rows[2][4:])] + rows[3:]
+
+
+def reference_douglas_peucker(latitude, longitude, tolerance_m):
+    """Textbook recursive Douglas-Peucker: which points of one track survive."""
+    y = [lat * METRES_PER_DEGREE for lat in latitude]
+    x = [
+        lon * METRES_PER_DEGREE * math.cos(math.radians(lat))
+        for lat, lon in zip(latitude, longitude)
+    ]
+    keep = [False] * len(x)
+    if not keep:
+        return keep
+    keep[0] = keep[-1] = True
+
+    def simplify(first, last):
+        if last - first < 2:
+            return
+        ax, ay = x[first], y[first]
+        dx, dy = x[last] - ax, y[last] - ay
+        length2 = dx * dx + dy * dy
+        furthest, split = -1.0, None
+        for i in range(first + 1, last):
+            t = ((x[i] - ax) * dx + (y[i] - ay) * dy) / length2 if length2 else 0.0
+            t = min(max(t, 0.0), 1.0)
+            distance = math.hypot(x[i] - (ax + t * dx), y[i] - (ay + t * dy))
+            if distance > furthest:
+                furthest, split = distance, i
+        if furthest >= tolerance_m:
+            keep[split] = True
+            simplify(first, split)
+            simplify(split, last)
+
+    simplify(0, len(x) - 1)
+    return keep
+
+
+@pytest.mark.parametrize("tolerance_m", [SIMPLIFY_MIN_TOLERANCE_M, 5.0, 15.0, 60.0])
+def test_douglas_peucker_significance_matches_recursive_reference(tolerance_m):
+    rng = np.random.default_rng(42)
+    tracks = []
+    for n in [1, 2, 150, 2, 1, 400, 3]:
+        # A random walk with steps of a few metres
+        tracks.append(-33.8 + np.cumsum(rng.normal(0, 5e-5, (n, 2)), axis=0))
+    # A closed loop, whose first and last chords have zero length
+    loop = np.linspace(0, 2 * np.pi, 80)
+    tracks.append(np.c_[-33.8 + 3e-4 * np.sin(loop), 151.0 + 3e-4 * np.cos(loop)])
+
+    coords = np.concatenate(tracks)
+    track_starts = np.cumsum([0] + [len(track) for track in tracks[:-1]])
+    significance = douglas_peucker_significance(
+        coords[:, 0], coords[:, 1], track_starts
+    )
+    expected = [
+        kept
+        for track in tracks
+        for kept in reference_douglas_peucker(track[:, 0], track[:, 1], tolerance_m)
+    ]
+    np.testing.assert_array_equal(significance >= tolerance_m, expected)
+
+    empty = douglas_peucker_significance(
+        np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)
+    )
+    assert empty.shape == (0,)
+
+
+def simplified_rows(duckdb_filepath):
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        return con.execute("""
+            SELECT workout_id, date, latitude, longitude, significance_m
+            FROM workout_points_simplified
+            ORDER BY workout_id, date
+        """).fetchall()
+
+
+def test_simplify_carries_tracks_across_chunks(tmp_path):
+    # With a batch size of 2048 each chunk is one 2048-row vector, so the first workout
+    # fills whole chunks and every track ends in a different one
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    workouts = [(start + timedelta(days=i), 600, -33.8 + 0.01 * i) for i in range(3)]
+    write_export(tmp_path / "export.zip", workouts, points_per_route=2500, jitter=2e-4)
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+    HealthKitConverter(
+        tmp_path / "export.zip",
+        None,
+        duckdb_filepath,
+        ["workouts", "workout_points"],
+        batch_size=2048,
+    ).run()
+
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        points = con.execute("""
+            SELECT workout_id, date, latitude, longitude
+            FROM workout_points
+            ORDER BY workout_id, date
+        """).fetchnumpy()
+    ids = points["workout_id"]
+    significance = douglas_peucker_significance(
+        points["latitude"],
+        points["longitude"],
+        np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]),
+    )
+    kept = np.flatnonzero(significance >= SIMPLIFY_MIN_TOLERANCE_M)
+    rows = simplified_rows(duckdb_filepath)
+    assert 6 < len(rows) < len(ids)
+    assert [(row[0], row[4]) for row in rows] == [
+        (ids[i], significance[i]) for i in kept
+    ]
+
+
+def test_incremental_simplify_keeps_untouched_workouts(tmp_path):
+    start = datetime(2024, 3, 1, 8, 0, tzinfo=UTC)
+    workouts = [(start + timedelta(days=i), 60, -33.8 + 0.01 * i) for i in range(3)]
+    write_export(tmp_path / "export.zip", workouts, points_per_route=200, jitter=1e-4)
+    duckdb_filepath = tmp_path / "healthkit.duckdb"
+    HealthKitConverter(
+        tmp_path / "export.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run()
+    before = simplified_rows(duckdb_filepath)
+
+    # A newer export changes the middle workout and adds a fourth
+    workouts[1] = (workouts[1][0], 75, -33.75)
+    workouts.append((start + timedelta(days=3), 60, -33.7))
+    write_export(tmp_path / "export_2.zip", workouts, points_per_route=200, jitter=1e-4)
+    HealthKitConverter(
+        tmp_path / "export_2.zip", None, duckdb_filepath, ["workouts", "workout_points"]
+    ).run(incremental=True)
+    after = simplified_rows(duckdb_filepath)
+
+    with duckdb.connect(str(duckdb_filepath), read_only=True) as con:
+        moved = con.execute(
+            "SELECT id FROM workouts WHERE startDate = ?", [workouts[1][0]]
+        ).fetchone()[0]
+    assert [row for row in before if row[0] != moved] == [
+        row for row in after if row[0] in {row[0] for row in before} - {moved}
+    ]
+
+    # And the whole table matches simplifying the newer export from scratch
+    HealthKitConverter(
+        tmp_path / "export_2.zip",
+        None,
+        tmp_path / "full.duckdb",
+        ["workouts", "workout_points"],
+    ).run()
+    assert after == simplified_rows(tmp_path / "full.duckdb")